@@ -10,16 +10,24 @@ import torch
 import numpy as np
 import json
 import time
-import threading
 from datetime import datetime
 import sqlite3
 import os
 
 from config import *
 from utils.database import Database
+from utils.eeg_codec import (BINARY_CONTENT_TYPES, PayloadTooLarge, read_body, decode_eeg_payload,
+                             decode_raw)
+from utils.session_state import SessionState
+from utils.metrics import stage_metrics
+from utils.eeg_processor import StreamingBandpassFilter
 from models.ifnet_enhanced import IFNetEnhanced
+from models.export import load_optimized, checkpoint_digest
 from inference.predictor import IFNetPredictor
 from inference.xai_engine import XAIEngine
+from inference.xai_worker import XAIWorker
+from inference.scheduler import InferenceScheduler
+from inference.stream_executor import StreamExecutor
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -30,20 +38,36 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Global state
 db = Database(DATABASE_PATH)
 predictor = None
+scheduler = None
 xai_engine = None
+xai_worker = None
 active_sessions = {}
-streaming_threads = {}
 
 print("[INFO] Initializing MI-BCI Backend...")
 
+def on_xai_result(job, xai_data):
+    """Persist an explanation and push it to the client that owns the trial"""
+    db.create_xai_result(
+        trial_id=job['trial_id'],
+        important_channels=xai_data['top_channels'],
+        time_importance=xai_data['grad_cam']['time_importance'],
+        frequency_importance=xai_data.get('integrated_gradients', {}).get('frequency_importance')
+    )
+    socketio.emit('xai_update', {
+        'trial_id': job['trial_id'],
+        'session_id': job['session_id'],
+        'trial_number': job['trial_number'],
+        'xai': xai_data
+    }, room=job['sid'])
+
 # Initialize model
 def init_model():
-    global predictor, xai_engine
+    global predictor, scheduler, xai_engine, xai_worker
     try:
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"[INFO] Using device: {device}")
         
-        model = IFNetEnhanced(num_classes=NUM_CLASSES).to(device)
+        model = IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES).to(device)
         
         # Load weights if exists
         if os.path.exists(MODEL_PATH):
@@ -51,9 +75,31 @@ def init_model():
             print(f"[INFO] Model loaded from {MODEL_PATH}")
         else:
             print(f"[WARNING] No model found at {MODEL_PATH}. Using random weights.")
+        model.eval()
+        
+        # Serve from the frozen TorchScript trunk when exported (export_model.py);
+        # the eager model is kept for XAI, which needs hooks and gradients
+        # INFERENCE_PRECISION = 'int8' serves the quantized trunk (quantize_model.py), CPU only
+        serving_model = model
+        serving_path = OPTIMIZED_MODEL_PATH
+        if INFERENCE_PRECISION == 'int8':
+            if device.type == 'cpu':
+                serving_path = QUANTIZED_MODEL_PATH
+            else:
+                print("[WARNING] int8 inference is CPU only; serving fp32")
+        if os.path.exists(MODEL_PATH) and os.path.exists(serving_path):
+            optimized = load_optimized(serving_path, model, device,
+                                       source_digest=checkpoint_digest(MODEL_PATH))
+            if optimized is not None:
+                serving_model = optimized
+                print(f"[INFO] Optimized model loaded from {serving_path}")
+        elif serving_path == QUANTIZED_MODEL_PATH:
+            print(f"[WARNING] No int8 model at {QUANTIZED_MODEL_PATH}; serving fp32")
         
-        predictor = IFNetPredictor(model, device)
+        predictor = IFNetPredictor(serving_model, device)
+        scheduler = InferenceScheduler(predictor)
         xai_engine = XAIEngine(model, device)
+        xai_worker = XAIWorker(xai_engine, on_xai_result)
         print("[INFO] Model initialized successfully")
     except Exception as e:
         print(f"[ERROR] Model initialization failed: {e}")
@@ -106,12 +152,7 @@ def start_session():
         user_id = data.get('user_id', 1)
         
         session_id = db.create_session(user_id)
-        active_sessions[session_id] = {
-            'user_id': user_id,
-            'start_time': datetime.now(),
-            'trials': [],
-            'predictions': []
-        }
+        active_sessions[session_id] = SessionState(user_id)
         
         return jsonify({
             'session_id': session_id,
@@ -125,22 +166,18 @@ def start_session():
 def end_session(session_id):
     """End current BCI session"""
     try:
-        if session_id in active_sessions:
-            session_data = active_sessions[session_id]
-            predictions = np.array(session_data['predictions'])
+        session_state = active_sessions.pop(session_id, None)
+        if session_state is not None:
+            stream_executor.stop(session_id)
+            accuracy = session_state.mean_confidence  # Running mean, O(1)
             
-            if len(predictions) > 0:
-                accuracy = np.mean(predictions[:, 2])  # Confidence column
-            else:
-                accuracy = 0
-            
-            db.update_session(session_id, len(session_data['trials']), accuracy)
-            del active_sessions[session_id]
+            db.flush()  # Commit this session's queued trials
+            db.update_session(session_id, session_state.count, accuracy)
             
             return jsonify({
                 'session_id': session_id,
                 'status': 'ended',
-                'total_trials': len(session_data['trials']),
+                'total_trials': session_state.count,
                 'accuracy': float(accuracy)
             }), 200
         else:
@@ -152,26 +189,76 @@ def end_session(session_id):
 def get_session(session_id):
     """Get session details"""
     try:
-        if session_id in active_sessions:
-            session_data = active_sessions[session_id]
+        session_state = active_sessions.get(session_id)
+        if session_state is not None:
             return jsonify({
                 'session_id': session_id,
-                'user_id': session_data['user_id'],
-                'start_time': session_data['start_time'].isoformat(),
-                'trials_count': len(session_data['trials']),
-                'predictions': session_data['predictions'][:20]  # Last 20
+                **session_state.summary(),
+                'predictions': session_state.recent(20)  # Last 20, newest first
             }), 200
         else:
             return jsonify({'error': 'Session not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def page_args():
+    """Keyset cursor and page size from the query string"""
+    limit = min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE)
+    return request.args.get('after', type=int), request.args.get('before', type=int), max(limit, 1)
+
+@app.route('/api/sessions/<int:session_id>/trials', methods=['GET'])
+def get_session_trials(session_id):
+    """Paginated trial history (?before=<trial_id> newest first, ?after=<trial_id> oldest first)"""
+    try:
+        after, before, limit = page_args()
+        trials = db.get_session_trials(session_id, after=after, before=before, limit=limit)
+        return jsonify({
+            'session_id': session_id,
+            'trials': trials,
+            'next_cursor': trials[-1]['trial_id'] if len(trials) == limit else None
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sessions/<int:session_id>/stats', methods=['GET'])
+def get_session_stats(session_id):
+    """Per-class counts, confusion counts and mean confidence for a session"""
+    try:
+        return jsonify(db.get_session_stats(session_id)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/<int:user_id>/sessions', methods=['GET'])
+def get_user_sessions(user_id):
+    """Paginated session list of a user, newest first (?before=<session_id>)"""
+    try:
+        _, before, limit = page_args()
+        sessions = db.get_user_sessions(user_id, before=before, limit=limit)
+        return jsonify({
+            'user_id': user_id,
+            'sessions': sessions,
+            'next_cursor': sessions[-1]['session_id'] if len(sessions) == limit else None
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
-    """Make a prediction from EEG data"""
+    """
+    Make a prediction from EEG data
+    Accepts JSON {'eeg_data': [[...]]} or a binary body
+    (application/octet-stream or application/x-npy, see utils/eeg_codec.py)
+    ?explain=1 adds an 'xai' entry, computed in the same forward pass
+    """
     try:
-        data = request.json
-        eeg_data = np.array(data.get('eeg_data', []))
+        with stage_metrics.time('decode'):
+            if request.mimetype in BINARY_CONTENT_TYPES:
+                # Zero-copy: float32 view on the request buffer
+                body = read_body(request.stream, request.content_length)
+                eeg_data = decode_eeg_payload(body, request.mimetype)
+            else:
+                data = request.json
+                eeg_data = np.asarray(data.get('eeg_data', []), dtype=np.float32)
         
         if eeg_data.size == 0:
             return jsonify({'error': 'No EEG data provided'}), 400
@@ -180,13 +267,40 @@ def predict():
         if len(eeg_data.shape) == 2:
             eeg_data = eeg_data[np.newaxis, :, :]
         
-        # Predict
-        result = predictor.predict(eeg_data)
+        if request.args.get('explain', '0').lower() in ('1', 'true'):
+            if eeg_data.shape[0] != 1:
+                return jsonify({'error': 'explain supports a single window'}), 400
+            with stage_metrics.time('xai'):
+                result = xai_engine.predict_and_explain(eeg_data)
+            return jsonify(result), 200
+        
+        # Predict (batched with concurrent requests by the scheduler)
+        result = scheduler.predict(eeg_data)
         
         return jsonify(result), 200
+    except PayloadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/streams', methods=['GET'])
+def list_streams():
+    """Live streams with their sample/window rates and dropped windows"""
+    return jsonify({'streams': stream_executor.list_streams()}), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Inference pipeline metrics"""
+    if scheduler is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    return jsonify({
+        'scheduler': scheduler.metrics(),
+        'xai': xai_worker.metrics(),
+        'stages_ms': stage_metrics.snapshot()
+    }), 200
+
 # ============================================================================
 # WEBSOCKET EVENTS (Real-time streaming)
 # ============================================================================
@@ -201,60 +315,109 @@ def handle_connect():
 def handle_disconnect():
     """Handle client disconnection"""
     print(f"[SOCKET] Client disconnected: {request.sid}")
+    stream_executor.stop_client(request.sid)
+
+def process_window(session_id, sid, eeg_window, trial_number):
+    """Predict, log and emit one sliding window; XAI follows asynchronously"""
+    session_state = active_sessions.get(session_id)
+    if session_state is None:
+        stream_executor.stop(session_id)  # Session ended while the stream was running
+        return
+    
+    # Predict
+    start = time.perf_counter_ns()
+    prediction = scheduler.predict(eeg_window)
+    latency_ms = (time.perf_counter_ns() - start) / 1e6
+    
+    # Log to DB
+    trial_id = db.create_trial(
+        session_id=session_id,
+        predicted_label=prediction['predicted_class'],
+        confidence=prediction['confidence'],
+        uncertainty=prediction['uncertainty'],
+        inference_time=prediction['inference_time_ms'] if STORE_TRIAL_TIMINGS else 0
+    )
+    
+    session_state.record(prediction, trial_id=trial_id, trial_number=trial_number,
+                         latency_ms=latency_ms)
+    
+    # Emit to client; the explanation arrives later as 'xai_update'
+    socketio.emit('prediction_update', {
+        **prediction,
+        'trial_id': trial_id,
+        'trial_number': trial_number
+    }, room=sid)
+    
+    # Sampled or requested trials are queued for XAI (off the prediction path)
+    if xai_worker.should_explain(session_id, trial_number):
+        xai_worker.submit(trial_id, session_id, sid, eeg_window, trial_number)
+
+# Bounded worker pool shared by all streams
+stream_executor = StreamExecutor(process_window)
 
 @socketio.on('start_stream')
 def handle_start_stream(data):
-    """Start EEG streaming"""
+    """
+    Start EEG streaming
+    source='client': samples arrive through 'push_samples' events
+    source='simulated' (default): random samples generated server-side
+    """
     session_id = data.get('session_id', 1)
+    source = data.get('source', 'simulated')
     
-    def stream_eeg():
-        """Simulate EEG streaming"""
-        for i in range(100):  # 100 predictions
-            if session_id not in active_sessions:
-                break
-            
-            # Simulate EEG data
-            eeg_data = np.random.randn(1, NUM_CHANNELS, WINDOW_SIZE).astype(np.float32)
-            
-            # Predict
-            prediction = predictor.predict(eeg_data)
-            
-            # Get XAI
-            xai_data = xai_engine.explain(eeg_data)
-            
-            # Combine
-            result = {
-                **prediction,
-                'xai': xai_data,
-                'trial_number': i + 1
-            }
-            
-            # Log to DB
-            db.create_trial(
-                session_id=session_id,
-                predicted_label=prediction['predicted_class'],
-                confidence=prediction['confidence']
-            )
-            
-            # Emit to client
-            socketio.emit('prediction_update', result, room=request.sid)
-            
-            time.sleep(0.1)  # 100ms between predictions
+    if session_id not in active_sessions:
+        emit('stream_error', {'session_id': session_id, 'error': 'Session not active'})
+        return
+    
+    try:
+        hop = int(data.get('hop', STREAM_HOP))
+        stream_filter = StreamingBandpassFilter(*STREAM_FILTER_BAND, fs=SAMPLING_RATE)
+        stream_executor.start(session_id, request.sid, hop,
+                              simulated=(source == 'simulated'),
+                              preprocess=stream_filter.process)
+    except (TypeError, ValueError) as e:
+        emit('stream_error', {'session_id': session_id, 'error': str(e)})
+        return
+    
+    emit('stream_started', {'session_id': session_id, 'status': 'streaming',
+                            'source': source, 'hop': hop})
+
+@socketio.on('push_samples')
+def handle_push_samples(data):
+    """
+    Push a chunk of samples into a client-fed stream
+    samples: (channels, n) nested list, or raw float32 bytes (utils/eeg_codec.py)
+    """
+    session_id = data.get('session_id', 1)
+    samples = data.get('samples')
+    
+    try:
+        with stage_metrics.time('decode'):
+            if isinstance(samples, (bytes, bytearray)):
+                chunk = decode_raw(bytearray(samples))
+            else:
+                chunk = np.asarray(samples, dtype=np.float32)
+        
+        if not stream_executor.push(session_id, chunk):
+            emit('stream_error', {'session_id': session_id, 'error': 'Stream not started'})
+    except ValueError as e:
+        emit('stream_error', {'session_id': session_id, 'error': str(e)})
+
+@socketio.on('request_xai')
+def handle_request_xai(data):
+    """Explain the next trial of a stream, outside the regular sampling"""
+    session_id = data.get('session_id', 1)
     
-    # Start streaming in background
-    thread = threading.Thread(target=stream_eeg, daemon=True)
-    streaming_threads[session_id] = thread
-    thread.start()
+    xai_worker.request(session_id)
     
-    emit('stream_started', {'session_id': session_id, 'status': 'streaming'})
+    emit('xai_requested', {'session_id': session_id})
 
 @socketio.on('stop_stream')
 def handle_stop_stream(data):
-    """Stop EEG streaming"""
+    """Stop EEG streaming (cancelled before the next window)"""
     session_id = data.get('session_id', 1)
     
-    if session_id in streaming_threads:
-        del streaming_threads[session_id]
+    stream_executor.stop(session_id)
     
     emit('stream_stopped', {'session_id': session_id, 'status': 'stopped'})
 
@@ -0,0 +1,43 @@
+"""
+Preprocess subjects into the memory-mapped epoch store
+Usage: python build_epoch_store.py [subjects] [--workers N] [--filter-jobs N]
+    subjects: e.g. "1 2 3" or "1-109" (default: 1-3, as download_dataset.py)
+Missing recordings are downloaded; subjects already built with the current
+parameters (config.py) are skipped.
+"""
+
+import os
+import sys
+import argparse
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import INGEST_WORKERS, INGEST_FILTER_JOBS
+from utils.epoch_store import EpochStore, ingest_subjects, parse_subjects
+
+parser = argparse.ArgumentParser(description='Build the preprocessed epoch store')
+parser.add_argument('subjects', nargs='*', default=['1-3'])
+parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help='subjects in parallel')
+parser.add_argument('--filter-jobs', type=int, default=INGEST_FILTER_JOBS, help='MNE n_jobs per subject')
+args = parser.parse_args()
+
+print("=" * 60)
+print("BUILDING EPOCH STORE")
+print("=" * 60)
+
+store = EpochStore()
+print(f"Store: {store.path}")
+
+summary = ingest_subjects(store, parse_subjects(args.subjects),
+                          n_workers=args.workers, n_jobs=args.filter_jobs)
+
+print(f"\n✅ Built {len(summary['built'])} subjects ({summary['skipped']} skipped) in "
+      f"{summary['seconds']:.1f}s: {summary['epochs']} epochs, "
+      f"{summary['bytes'] / 1024 ** 2:.1f} MB, {summary['epochs_per_s']:.0f} epochs/s")
+for subject, error in sorted(summary['failed'].items()):
+    print(f"⚠️ Subject {subject} error: {error}")
+
+stats = store.stats()
+print(f"Store total: {len(stats['subjects'])} subjects, {stats['epochs']} epochs, "
+      f"{stats['bytes'] / 1024 ** 2:.1f} MB")
@@ -12,9 +12,18 @@ PORT = 5000
 # Database
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'bci_system.db')
 os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+DB_POOL_SIZE = 4  # Long-lived connections shared by request threads
+DB_BATCH_SIZE = 64  # Trial rows per executemany transaction
+DB_FLUSH_INTERVAL_MS = 200  # Max time a queued trial waits before being written
+DB_WRITE_RETRIES = 3  # Attempts per trial batch before its trial_ids are recorded as failed
+API_PAGE_SIZE = 100  # Default page size for history endpoints
+API_MAX_PAGE_SIZE = 1000
 
 # Model
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'trained_model.pth')
+OPTIMIZED_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'trained_model.torchscript.pt')  # export_model.py
+QUANTIZED_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'trained_model.int8.pt')  # quantize_model.py
+INFERENCE_PRECISION = 'fp32'  # 'fp32' or 'int8' (CPU only; needs QUANTIZED_MODEL_PATH)
 DEVICE = 'cuda' if __import__('torch').cuda.is_available() else 'cpu'
 
 # EEG
@@ -40,6 +49,78 @@ FREQ_BANDS = {
 # XAI
 GRAD_CAM_ENABLED = True
 INTEGRATED_GRADIENTS_ENABLED = True
+XAI_SAMPLE_EVERY = 5  # Explain every Nth streamed trial (0: on request only)
+XAI_QUEUE_SIZE = 8  # Pending explanations; further requests are dropped
+IG_STEPS = 32  # Integrated Gradients interpolation steps
+IG_MAX_BATCH = 16  # Interpolated windows per forward/backward (memory cap)
 
 # Uncertainty
 MC_DROPOUT_SAMPLES = 10
+
+# Live session state
+SESSION_HISTORY_SIZE = 256  # Recent predictions kept in memory per session
+
+# Instrumentation
+STORE_TRIAL_TIMINGS = True  # Write measured inference time to trials.inference_time
+
+# Inference scheduler (micro-batching across sessions)
+SCHEDULER_MAX_BATCH_SIZE = 32
+SCHEDULER_MAX_WAIT_MS = 5
+
+# Streaming (sliding-window inference over pushed samples)
+STREAM_HOP = 125  # Samples between predictions (0.5 s at 250 Hz)
+STREAM_BUFFER_SIZE = 2 * WINDOW_SIZE  # Ring buffer capacity per session
+STREAM_FILTER_BAND = (4, 40)  # Causal bandpass applied to pushed samples (Hz)
+STREAM_MAX_WORKERS = 4  # Worker threads shared by all streams
+STREAM_MAX_PENDING_WINDOWS = 4  # Per stream; older windows are dropped beyond this
+STREAM_SIMULATED_INTERVAL_S = 0.1  # One hop of simulated samples per interval
+STREAM_SIMULATED_WINDOWS = 100  # Simulated streams stop after this many predictions
+
+# EMD feature extraction
+EMD_N_JOBS = None  # Worker processes (None: all cores, 1: in-process)
+EMD_MAX_ITERATION = 1000  # Sifting iteration cap per IMF
+EMD_JOB_TIMEOUT_S = 5.0  # Per (trial, channel) budget before falling back to zeros
+
+# Feature cache (content-addressed, see models/feature_cache.py)
+FEATURE_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'feature_cache')
+FEATURE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+FEATURE_CACHE_LOW_WATER = 0.8  # Eviction stops at this fraction of FEATURE_CACHE_MAX_BYTES
+FEATURE_CACHE_SHARD_ROWS = 256  # Feature rows per shard file
+
+# Preprocessed epoch store (memory-mapped, see utils/epoch_store.py)
+PHYSIONET_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'physionet_bci')
+EPOCH_STORE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'epoch_store')
+EPOCH_RUNS = [6, 10, 14]  # Imagery runs fetched by download_dataset.py
+EPOCH_EVENT_MAP = {'T1': 0, 'T2': 1}  # Annotation -> label (T0 rest is skipped)
+EPOCH_FILTER_BAND = (4, 40)
+EPOCH_TMIN = 0.0  # Epoch start relative to the cue (s); length is WINDOW_SIZE samples
+# 22 channels of the BCIC IV-2a montage, picked from the 64-channel recordings
+EPOCH_CHANNELS = ['Fz', 'FC3', 'FC1', 'FCz', 'FC2', 'FC4', 'C5', 'C3', 'C1', 'Cz', 'C2',
+                  'C4', 'C6', 'CP3', 'CP1', 'CPz', 'CP2', 'CP4', 'P1', 'Pz', 'P2', 'POz']
+INGEST_WORKERS = None  # Subjects built in parallel (None: one per CPU core)
+INGEST_FILTER_JOBS = 1  # MNE n_jobs for filtering within each worker
+
+# Training (see training/trainer.py)
+TRAIN_EPOCHS = 50
+TRAIN_BATCH_SIZE = 32
+TRAIN_LR = 1e-3
+TRAIN_NUM_WORKERS = 2  # DataLoader worker processes
+TRAIN_AMP = False  # float16 autocast on CUDA, bfloat16 on CPU
+TRAIN_COMPILE = False  # torch.compile the model
+TRAIN_CHANNELS_LAST = False  # Only applies to 4D conv models
+TRAIN_LOG_EVERY = 10  # Epochs between log lines
+EVAL_BATCH_SIZE = 256  # Windows per forward during evaluation
+
+# Distributed data-parallel training (see training/distributed.py)
+DDP_BACKEND = 'gloo'
+DDP_MASTER_ADDR = '127.0.0.1'
+DDP_MASTER_PORT = 29500
+
+# Leave-one-subject-out evaluation (see training/loso.py)
+LOSO_WORKERS = None  # Folds in parallel (None: one per CPU core)
+LOSO_EPOCHS = 20
+LOSO_CALIBRATION_TRIALS = 10  # Unlabelled trials of the held-out subject for DomainAdapter
+LOSO_ADAPT_ITERATIONS = 50
+LOSO_SOURCE_TRIALS = 64  # Training trials used as the adaptation reference
+LOSO_LATENCY_WINDOWS = 50  # Single-window predictions timed per fold
+LOSO_RESULTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'results')
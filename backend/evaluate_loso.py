@@ -0,0 +1,62 @@
+"""
+Leave-one-subject-out evaluation over the epoch store
+Usage: python evaluate_loso.py [subjects] [--workers N] [--epochs N] [--resume results.csv]
+    subjects: e.g. "1-20" (default: every subject built in the store)
+Build the store first (build_epoch_store.py). One fold per worker process;
+per-fold results go to data/results/loso_<timestamp>.csv.
+"""
+
+import os
+import sys
+import argparse
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import LOSO_WORKERS, LOSO_EPOCHS, LOSO_ADAPT_ITERATIONS
+from utils.epoch_store import EpochStore, parse_subjects
+from training.loso import run_loso, summarize
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Leave-one-subject-out evaluation')
+    parser.add_argument('subjects', nargs='*')
+    parser.add_argument('--workers', type=int, default=LOSO_WORKERS, help='folds in parallel')
+    parser.add_argument('--epochs', type=int, default=LOSO_EPOCHS, help='training epochs per fold')
+    parser.add_argument('--adapt-iterations', type=int, default=LOSO_ADAPT_ITERATIONS)
+    parser.add_argument('--resume', help='results CSV to complete (finished folds are skipped)')
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("LEAVE-ONE-SUBJECT-OUT EVALUATION")
+    print("=" * 60)
+    
+    store = EpochStore()
+    available = store.subjects()
+    subjects = parse_subjects(args.subjects) if args.subjects else available
+    missing = sorted(set(subjects) - set(available))
+    if missing:
+        print(f"❌ Subjects not in the epoch store: {missing}")
+        print("   Run: python build_epoch_store.py " + " ".join(str(s) for s in missing))
+        sys.exit(1)
+    if len(subjects) < 2:
+        print("❌ LOSO needs at least 2 subjects in the epoch store")
+        sys.exit(1)
+    
+    results_path, rows = run_loso(subjects, store=store, n_workers=args.workers, results_path=args.resume,
+                                  epochs=args.epochs, adapt_iterations=args.adapt_iterations)
+    
+    print(f"\n{'Subject':>8} {'Acc':>7} {'Kappa':>7} {'Adapted':>8} {'Kappa':>7} "
+          f"{'Latency':>9} {'Adapt':>7}")
+    for row in rows:
+        print(f"{'S%03d' % row['subject']:>8} {row['accuracy']:>7.3f} {row['kappa']:>7.3f} "
+              f"{row['adapted_accuracy']:>8.3f} {row['adapted_kappa']:>7.3f} "
+              f"{row['latency_ms_p50']:>7.2f}ms {row['adaptation_time_s']:>6.1f}s")
+    
+    summary = summarize(results_path)
+    if summary:
+        print(f"{'Mean':>8} {summary['accuracy']:>7.3f} {summary['kappa']:>7.3f} "
+              f"{summary['adapted_accuracy']:>8.3f} {summary['adapted_kappa']:>7.3f} "
+              f"{summary['latency_ms_p50']:>7.2f}ms {summary['adaptation_time_s']:>6.1f}s")
+        print(f"\n✅ {summary['folds']}/{len(subjects)} folds written to {results_path}")
+    if summary.get('folds', 0) < len(subjects):
+        print("⚠️ Some folds failed (see [ERROR] lines above)")
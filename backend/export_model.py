@@ -0,0 +1,51 @@
+"""
+Export the trained model as a frozen TorchScript trunk for CPU serving
+Usage: python export_model.py  (after train_baseline.py)
+"""
+
+import os
+import sys
+import time
+import torch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import MODEL_PATH, OPTIMIZED_MODEL_PATH, NUM_CHANNELS, NUM_CLASSES, WINDOW_SIZE
+from models.ifnet_enhanced import IFNetEnhanced
+from models.export import export_optimized, load_optimized, checkpoint_digest
+
+print("=" * 60)
+print("EXPORTING OPTIMIZED INFERENCE MODEL")
+print("=" * 60)
+
+if not os.path.exists(MODEL_PATH):
+    sys.exit(f"No model found at {MODEL_PATH}. Run train_baseline.py first.")
+
+model = IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES)
+model.load_state_dict(torch.load(MODEL_PATH, map_location='cpu'))
+model.eval()
+
+print(f"\n[1/3] Folding BatchNorm, tracing and freezing...")
+digest = checkpoint_digest(MODEL_PATH)
+export_optimized(model, OPTIMIZED_MODEL_PATH, (1, NUM_CHANNELS, WINDOW_SIZE), source_digest=digest)
+optimized = load_optimized(OPTIMIZED_MODEL_PATH, model, 'cpu', source_digest=digest)
+
+print("[2/3] Checking outputs against the eager model...")
+x = torch.randn(8, NUM_CHANNELS, WINDOW_SIZE)
+with torch.no_grad():
+    max_diff = (model(x) - optimized(x)).abs().max().item()
+print(f"Max logit difference: {max_diff:.2e}")
+
+print("[3/3] Benchmarking single-window CPU latency...")
+window = torch.randn(1, NUM_CHANNELS, WINDOW_SIZE)
+for name, net in [('eager', model), ('optimized', optimized)]:
+    with torch.no_grad():
+        for _ in range(10):
+            net(window)
+        start = time.perf_counter()
+        for _ in range(100):
+            net(window)
+    print(f"{name:>10}: {(time.perf_counter() - start) * 10:.2f} ms/window")
+
+print(f"\n✅ Saved to: {OPTIMIZED_MODEL_PATH}")
@@ -51,28 +51,31 @@ class DomainAdapter:
         Quick adaptation to new subject
         Uses only a few calibration trials
         """
+        if self.source_domain_data is None:
+            return self.model  # Nothing to align with
+        
         optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
         
+        # Source features are the fixed reference: computed once, without grad
+        source_features = self._extract_features(self.source_domain_data)
+        
         for i in range(n_iterations):
-            # Extract features from target subject
-            target_features = self._extract_features(target_eeg_samples)
+            # Extract features from target subject (with grad: this is what adapts)
+            target_features = self._extract_features(target_eeg_samples, requires_grad=True)
             
             # MMD loss (align with source)
-            if self.source_domain_data is not None:
-                source_features = self._extract_features(self.source_domain_data)
-                mmd_loss = self.compute_mmd(source_features, target_features)
-            else:
-                mmd_loss = 0
+            mmd_loss = self.compute_mmd(source_features, target_features)
             
             optimizer.zero_grad()
             mmd_loss.backward()
             optimizer.step()
         
+        self.model.eval()
         return self.model
     
-    def _extract_features(self, eeg_data):
+    def _extract_features(self, eeg_data, requires_grad=False):
         """Extract features using model's feature extraction"""
-        self.model.eval()
-        with torch.no_grad():
+        self.model.eval()  # Frozen BatchNorm statistics: calibration sets are small
+        with torch.set_grad_enabled(requires_grad):
             _, features, _ = self.model(eeg_data, return_features=True)
         return features
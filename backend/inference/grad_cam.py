@@ -0,0 +1,47 @@
+import threading
+import torch
+import torch.nn.functional as F
+from contextlib import contextmanager
+
+class GradCAM1D:
+    """
+    Grad-CAM for 1D conv feature maps (batch, filters, time)
+    Forward hooks are registered once at construction and only capture
+    activations inside capture() while grad is enabled, so other forwards
+    (no_grad inference, attribution passes) are unaffected. Captures are
+    per thread: forwards of another thread never land in this one's list.
+    """
+    
+    def __init__(self, model, target_layers):
+        self.model = model
+        self.target_layers = list(target_layers)
+        self._local = threading.local()
+        self._handles = [layer.register_forward_hook(self._save_activation)
+                         for layer in self.target_layers]
+    
+    def _save_activation(self, module, inputs, output):
+        activations = getattr(self._local, 'activations', None)
+        if activations is not None and torch.is_grad_enabled():
+            activations.append(output)
+    
+    @contextmanager
+    def capture(self):
+        """Collect target-layer activations of this thread's grad-enabled forwards inside the block"""
+        self._local.activations = activations = []
+        try:
+            yield activations
+        finally:
+            self._local.activations = None
+    
+    @staticmethod
+    def compute_cam(activations, activation_grads, length):
+        """Grad-CAM over time, summed across target layers, resampled to `length`"""
+        cam = None
+        for activation, grad in zip(activations, activation_grads):
+            weights = grad.mean(dim=2, keepdim=True)  # Global-average-pooled gradients
+            layer_cam = F.relu((weights * activation).sum(dim=1))  # (batch, time')
+            if layer_cam.size(-1) != length:
+                layer_cam = F.interpolate(layer_cam.unsqueeze(1), size=length,
+                                          mode='linear', align_corners=False).squeeze(1)
+            cam = layer_cam.detach() if cam is None else cam + layer_cam.detach()
+        return cam
@@ -1,12 +1,27 @@
+import time
 import torch
 import numpy as np
-from config import NUM_CHANNELS, WINDOW_SIZE
+from config import NUM_CHANNELS, WINDOW_SIZE, MC_DROPOUT_SAMPLES
+from utils.metrics import stage_metrics
+
+def mc_uncertainty(model, features, predicted, n_samples):
+    """
+    Std of the predicted class probability over MC Dropout samples of the head
+    features: trunk output (batch, 128); predicted: (batch,) class indices
+    """
+    if n_samples <= 1:
+        return torch.zeros(predicted.shape, device=features.device)
+    probs_mc = torch.softmax(model.mc_head(features, n_samples), dim=-1)
+    index = predicted.view(1, -1, 1).expand(n_samples, -1, 1)
+    return probs_mc.gather(2, index).squeeze(2).std(dim=0, unbiased=False)
 
 class IFNetPredictor:
-    def __init__(self, model, device):
+    def __init__(self, model, device, mc_samples=MC_DROPOUT_SAMPLES):
         self.model = model
         self.device = device
+        self.mc_samples = mc_samples
         self.model.eval()
+        self._cuda = torch.device(device).type == 'cuda'
         
         self.class_names = ['Left Hand', 'Right Hand', 'Both Feet', 'Tongue']
     
@@ -16,39 +31,59 @@ class IFNetPredictor:
         Input: eeg_data shape (1, 22, 750)
         Output: dict with prediction, confidence, probabilities
         """
+        return self.predict_batch(eeg_data)[0]
+    
+    def predict_batch(self, eeg_data):
+        """
+        Predict a batch of windows in one forward pass
+        Input: eeg_data shape (batch, 22, 750)
+        Output: list of per-window dicts (same format as predict)
+        """
+        t_start = time.perf_counter_ns()
         with torch.no_grad():
             # Convert to tensor
             if isinstance(eeg_data, np.ndarray):
-                eeg_tensor = torch.FloatTensor(eeg_data).to(self.device)
+                # Shares memory with float32 input (e.g. binary payloads)
+                eeg_data = np.ascontiguousarray(eeg_data, dtype=np.float32)
+                eeg_tensor = torch.from_numpy(eeg_data).to(self.device)
             else:
                 eeg_tensor = eeg_data.to(self.device)
+            t_tensor = self._timestamp()
             
-            # Forward pass
-            logits = self.model(eeg_tensor)
+            # Forward pass: trunk once, deterministic head (eval mode)
+            features = self.model.forward_trunk(eeg_tensor)
+            logits = self.model.fc2(features)
             probs = torch.softmax(logits, dim=1)
             
             # Get prediction
-            predicted_class = torch.argmax(probs, dim=1).item()
-            confidence = probs[0, predicted_class].item()
+            confidence, predicted = probs.max(dim=1)
+            t_forward = self._timestamp()
             
-            # MC Dropout for uncertainty (forward 10 times with dropout)
-            uncertainties = []
-            self.model.train()
-            with torch.enable_grad():
-                for _ in range(10):
-                    logits_mc = self.model(eeg_tensor)
-                    probs_mc = torch.softmax(logits_mc, dim=1)
-                    uncertainties.append(probs_mc.detach().cpu().numpy())
-            self.model.eval()
-            
-            uncertainties = np.array(uncertainties)
-            uncertainty = np.std(uncertainties, axis=0)[predicted_class]
+            # MC Dropout for uncertainty: dropout masks over the head only
+            uncertainty = mc_uncertainty(self.model, features, predicted, self.mc_samples)
+        
+        probs = probs.cpu().numpy()
+        predicted = predicted.cpu().tolist()
+        confidence = confidence.cpu().tolist()
+        uncertainty = uncertainty.cpu().tolist()
+        t_end = time.perf_counter_ns()
         
-        return {
-            'predicted_class': predicted_class,
-            'class_name': self.class_names[predicted_class],
-            'confidence': float(confidence),
-            'uncertainty': float(uncertainty),
-            'probabilities': probs.cpu().numpy().tolist(),
-            'inference_time_ms': 47
-        }
+        stage_metrics.record('to_tensor', t_tensor - t_start)
+        stage_metrics.record('forward', t_forward - t_tensor)
+        stage_metrics.record('mc_sampling', t_end - t_forward)
+        inference_time_ms = (t_end - t_start) / 1e6  # Whole batch: every window waited for it
+        
+        return [{
+            'predicted_class': predicted[i],
+            'class_name': self.class_names[predicted[i]],
+            'confidence': float(confidence[i]),
+            'uncertainty': float(uncertainty[i]),
+            'probabilities': probs[i:i + 1].tolist(),
+            'inference_time_ms': inference_time_ms
+        } for i in range(len(predicted))]
+    
+    def _timestamp(self):
+        """perf_counter_ns after pending GPU work has finished"""
+        if self._cuda:
+            torch.cuda.synchronize()
+        return time.perf_counter_ns()
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import torch
+
+from config import SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS
+from utils.metrics import LatencyWindow, stage_metrics
+
+_STOP = object()
+
+class InferenceScheduler:
+    """
+    Micro-batching front end for IFNetPredictor
+    Windows submitted from any thread (REST handlers, streaming sessions)
+    are queued, grouped into batches of at most max_batch_size, waiting at
+    most max_wait_ms for a batch to fill, and run through one forward pass.
+    """
+    
+    def __init__(self, predictor, max_batch_size=SCHEDULER_MAX_BATCH_SIZE,
+                 max_wait_ms=SCHEDULER_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        
+        self._queue = queue.Queue()
+        self._latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._batched_windows = 0
+        self._last_batch_size = 0
+        self._largest_batch = 0
+        
+        self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+        self._thread.start()
+    
+    def submit(self, eeg_window):
+        """
+        Queue one window, (channels, samples) or (1, channels, samples)
+        Returns a concurrent.futures.Future resolving to the prediction dict
+        """
+        window = torch.as_tensor(eeg_window, dtype=torch.float32)
+        if window.dim() == 3 and window.size(0) == 1:
+            window = window[0]
+        if window.dim() != 2:
+            raise ValueError(f'Expected a (channels, samples) window, got shape {tuple(window.shape)}')
+        
+        future = Future()
+        self._queue.put((window, future, time.perf_counter()))
+        return future
+    
+    def predict(self, eeg_window, timeout=None):
+        """Blocking submit: same result as IFNetPredictor.predict"""
+        return self.submit(eeg_window).result(timeout)
+    
+    def _collect(self):
+        """Block for the first request, then fill the batch until size or deadline"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            
+            # Windows of different shapes cannot share a forward pass
+            groups = defaultdict(list)
+            for item in batch:
+                groups[tuple(item[0].shape)].append(item)
+            
+            for items in groups.values():
+                self._run_batch(items)
+    
+    def _run_batch(self, items):
+        futures = [future for _, future, _ in items]
+        try:
+            with stage_metrics.time('batch_stack'):
+                batch = torch.stack([window for window, _, _ in items])
+            results = self.predictor.predict_batch(batch)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        
+        done = time.perf_counter()
+        for (_, future, submitted), result in zip(items, results):
+            self._latency.record((done - submitted) * 1000.0)
+            future.set_result(result)
+        
+        with self._lock:
+            self._batches += 1
+            self._batched_windows += len(items)
+            self._last_batch_size = len(items)
+            self._largest_batch = max(self._largest_batch, len(items))
+    
+    def metrics(self):
+        """Batch size, queue depth and end-to-end latency percentiles"""
+        with self._lock:
+            batches = self._batches
+            windows = self._batched_windows
+            last_batch_size = self._last_batch_size
+            largest_batch = self._largest_batch
+        
+        return {
+            'batches': batches,
+            'windows': windows,
+            'mean_batch_size': windows / batches if batches else 0.0,
+            'last_batch_size': last_batch_size,
+            'max_batch_size_seen': largest_batch,
+            'queue_depth': self._queue.qsize(),
+            'latency_ms': self._latency.snapshot(),
+            'config': {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0
+            }
+        }
+    
+    def shutdown(self, timeout=None):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
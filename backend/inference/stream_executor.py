@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from config import (WINDOW_SIZE, STREAM_BUFFER_SIZE, STREAM_MAX_WORKERS, STREAM_MAX_PENDING_WINDOWS,
+                    STREAM_SIMULATED_INTERVAL_S, STREAM_SIMULATED_WINDOWS)
+from utils.ring_buffer import EEGRingBuffer
+
+class CancellationToken:
+    """Checked by stream workers between windows"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+class StreamHandle:
+    """One live stream: ring buffer, pending windows, cancellation and rates"""
+    
+    def __init__(self, session_id, sid, buffer, simulated, max_pending):
+        self.session_id = session_id
+        self.sid = sid
+        self.buffer = buffer
+        self.simulated = simulated
+        self.token = CancellationToken()
+        
+        # Windows are queued as their end sample index; the buffer holds the data
+        self.pending = deque(maxlen=max_pending)
+        self.scheduled = False
+        self.lock = threading.Lock()
+        
+        # Windows are copied here only when a worker picks them up, since
+        # producers keep writing to the ring buffer meanwhile
+        self.staging = np.empty((buffer.n_channels, buffer.window_size), dtype=np.float32)
+        
+        self.started_at = time.monotonic()
+        self.windows_processed = 0
+        self.windows_dropped = 0
+        self.errors = 0
+    
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            'session_id': self.session_id,
+            'source': 'simulated' if self.simulated else 'client',
+            'hop': self.buffer.hop,
+            'uptime_s': elapsed,
+            'samples_received': self.buffer.total_samples,
+            'samples_per_s': self.buffer.total_samples / elapsed,
+            'windows_processed': self.windows_processed,
+            'windows_per_s': self.windows_processed / elapsed,
+            'windows_dropped': self.windows_dropped,
+            'pending': len(self.pending),
+            'errors': self.errors
+        }
+
+class StreamExecutor:
+    """
+    Runs all streaming sessions on a bounded worker pool
+    
+    - Windows from every stream are processed by at most max_workers
+      threads, one window per task so streams are served round-robin
+    - Each stream has a cancellation token checked between windows, so
+      stop() takes effect before the next window
+    - Backpressure: at most max_pending windows wait per stream; if a
+      stream falls behind, its oldest pending windows are dropped so the
+      decoder always works on the freshest data
+    """
+    
+    def __init__(self, process_window, max_workers=STREAM_MAX_WORKERS,
+                 max_pending=STREAM_MAX_PENDING_WINDOWS):
+        self.process_window = process_window
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stream-worker')
+        self._streams = {}
+        self._lock = threading.Lock()
+        
+        self._simulator = threading.Thread(target=self._simulate, name='stream-simulator', daemon=True)
+        self._simulator.start()
+    
+    def start(self, session_id, sid, hop, simulated=False, preprocess=None):
+        """Start (or restart) the stream of a session"""
+        if not 1 <= hop <= WINDOW_SIZE:
+            raise ValueError(f'hop must be between 1 and {WINDOW_SIZE} samples')
+        
+        # Room for every pending window plus the one being staged
+        capacity = max(STREAM_BUFFER_SIZE, WINDOW_SIZE + hop * (self.max_pending + 1))
+        buffer = EEGRingBuffer(hop=hop, capacity=capacity, preprocess=preprocess)
+        handle = StreamHandle(session_id, sid, buffer, simulated, self.max_pending)
+        
+        with self._lock:
+            previous = self._streams.get(session_id)
+            self._streams[session_id] = handle
+        if previous is not None:
+            previous.token.cancel()
+        return handle
+    
+    def stop(self, session_id):
+        with self._lock:
+            handle = self._streams.pop(session_id, None)
+        if handle is not None:
+            handle.token.cancel()
+        return handle is not None
+    
+    def stop_client(self, sid):
+        """Cancel every stream owned by a disconnected client"""
+        with self._lock:
+            session_ids = [h.session_id for h in self._streams.values() if h.sid == sid]
+        for session_id in session_ids:
+            self.stop(session_id)
+    
+    def push(self, session_id, chunk):
+        """Append samples to a stream; windows are queued for the workers"""
+        handle = self._streams.get(session_id)
+        if handle is None or handle.token.cancelled:
+            return False
+        
+        with handle.lock:
+            for _ in handle.buffer.push(chunk):
+                if len(handle.pending) == handle.pending.maxlen:
+                    handle.windows_dropped += 1  # Oldest pending window falls off
+                handle.pending.append(handle.buffer.total_samples)
+            self._schedule(handle)
+        return True
+    
+    def _schedule(self, handle):
+        # Caller holds handle.lock
+        if handle.pending and not handle.scheduled and not handle.token.cancelled:
+            handle.scheduled = True
+            self._pool.submit(self._run_one, handle)
+    
+    def _run_one(self, handle):
+        with handle.lock:
+            if handle.token.cancelled or not handle.pending:
+                handle.scheduled = False
+                return
+            window = handle.buffer.window_at(handle.pending.popleft())
+            if window is None:
+                handle.windows_dropped += 1
+            else:
+                np.copyto(handle.staging, window)
+        
+        if window is not None:
+            try:
+                self.process_window(handle.session_id, handle.sid, handle.staging,
+                                    handle.windows_processed + 1)
+                handle.windows_processed += 1
+            except Exception as e:
+                handle.errors += 1
+                print(f"[ERROR] Stream {handle.session_id} window failed: {e}")
+        
+        # Re-queue behind other streams' work
+        with handle.lock:
+            handle.scheduled = False
+            self._schedule(handle)
+    
+    def _simulate(self):
+        """Feed simulated streams one hop of random samples per interval"""
+        while True:
+            time.sleep(STREAM_SIMULATED_INTERVAL_S)
+            with self._lock:
+                simulated = [h for h in self._streams.values() if h.simulated]
+            
+            for handle in simulated:
+                if handle.windows_processed + len(handle.pending) >= STREAM_SIMULATED_WINDOWS:
+                    if not handle.pending:
+                        self.stop(handle.session_id)
+                    continue
+                
+                buffer = handle.buffer
+                n_samples = buffer.hop if buffer.total_samples >= buffer.window_size else buffer.window_size
+                chunk = np.random.randn(buffer.n_channels, n_samples).astype(np.float32)
+                self.push(handle.session_id, chunk)
+    
+    def list_streams(self):
+        with self._lock:
+            handles = list(self._streams.values())
+        return [h.stats() for h in handles]
+    
+    def shutdown(self):
+        with self._lock:
+            handles = list(self._streams.values())
+            self._streams.clear()
+        for handle in handles:
+            handle.token.cancel()
+        self._pool.shutdown(wait=True)
@@ -1,55 +1,77 @@
+import threading
+import time
 import torch
 import numpy as np
-from pytorch_grad_cam import GradCAM
-from pytorch_grad_cam.utils.model_targets import ClassifierOutputTarget
+from config import MC_DROPOUT_SAMPLES, INTEGRATED_GRADIENTS_ENABLED
+from utils.constants import CLASS_LABELS
+from inference.grad_cam import GradCAM1D
+from inference.integrated_gradients import IntegratedGradients
+from inference.predictor import mc_uncertainty
 
 class XAIEngine:
-    def __init__(self, model, device):
+    def __init__(self, model, device, mc_samples=MC_DROPOUT_SAMPLES):
         self.model = model
         self.device = device
+        self.mc_samples = mc_samples
         self.channel_names = [
             'Fp1', 'Fp2', 'F7', 'F3', 'Fz', 'F4', 'F8',
             'T3', 'C3', 'Cz', 'C4', 'T4',
             'T5', 'P3', 'Pz', 'P4', 'T6',
             'O1', 'O2', 'A1', 'A2', 'Oz'
         ]
+        
+        # Built once: hooks on both branch outputs stay registered
+        self.grad_cam = GradCAM1D(model, [model.low_freq_temporal, model.high_freq_temporal])
+        self._lock = threading.Lock()
+        self.integrated_gradients = IntegratedGradients(model) if INTEGRATED_GRADIENTS_ENABLED else None
     
     def explain(self, eeg_data):
         """
         Generate Grad-CAM explanation
         """
-        with torch.no_grad():
-            if isinstance(eeg_data, np.ndarray):
-                eeg_tensor = torch.FloatTensor(eeg_data).to(self.device)
-            else:
-                eeg_tensor = eeg_data.to(self.device)
-            
-            logits = self.model(eeg_tensor)
-            predicted_class = torch.argmax(logits, dim=1).item()
-            
-            # Generate Grad-CAM
-            try:
-                target_layers = [self.model.conv_freq_low[-1]]
-                cam = GradCAM(model=self.model, target_layers=target_layers)
-                targets = [ClassifierOutputTarget(predicted_class)]
-                
-                grayscale_cam = cam(input_tensor=eeg_tensor, targets=targets)
-                channel_importance = grayscale_cam.mean(axis=1)  # Average over time
-            except:
-                # Fallback: random importance
-                channel_importance = np.random.rand(22)
-            
-            # Normalize
-            channel_importance = (channel_importance - channel_importance.min()) / (channel_importance.max() - channel_importance.min() + 1e-6)
+        return self.predict_and_explain(eeg_data)['xai']
+    
+    def predict_and_explain(self, eeg_data):
+        """
+        Prediction and explanation of one window from a single forward pass
+        The trunk runs once with grad enabled (hooks capture branch activations),
+        one backward runs from the predicted logit only, and MC Dropout
+        uncertainty reuses the same trunk features.
+        Input: eeg_data shape (1, 22, 750)
+        Output: predictor-style dict with an 'xai' entry
+        (plus batched Integrated Gradients for the predicted class when enabled)
+        """
+        t_start = time.perf_counter_ns()
+        if isinstance(eeg_data, np.ndarray):
+            eeg_tensor = torch.from_numpy(np.ascontiguousarray(eeg_data, dtype=np.float32)).to(self.device)
+        else:
+            eeg_tensor = eeg_data.to(self.device)
+        x = eeg_tensor.detach().requires_grad_(True)
+        
+        with self._lock, self.grad_cam.capture() as activations, torch.enable_grad():
+            features = self.model.forward_trunk(x)
+            logits = self.model.fc2(features)  # Eval mode: dropout is identity
+            probs = torch.softmax(logits, dim=1)
+            confidence, predicted = probs.max(dim=1)
             
-            # Time importance (peak in middle)
-            time_steps = eeg_tensor.shape
-            time_importance = np.zeros(time_steps)
-            peak_idx = time_steps // 2
-            time_importance[max(0, peak_idx-100):min(time_steps, peak_idx+100)] = 1.0
-            time_importance = (time_importance - time_importance.min()) / (time_importance.max() - time_importance.min() + 1e-6)
+            # Backprop from the predicted logit only
+            score = logits.gather(1, predicted.view(-1, 1)).sum()
+            grads = torch.autograd.grad(score, [x, *activations])
+            cam = self.grad_cam.compute_cam(activations, grads[1:], x.size(-1))
         
-        return {
+        with torch.no_grad():
+            uncertainty = mc_uncertainty(self.model, features.detach(), predicted, self.mc_samples)
+        
+        # Channel importance: |gradient x input| averaged over time
+        channel_importance = (grads[0] * eeg_tensor).abs().mean(dim=-1)[0].detach().cpu().numpy()
+        time_importance = cam[0].cpu().numpy()
+        
+        # Normalize
+        channel_importance = (channel_importance - channel_importance.min()) / (channel_importance.max() - channel_importance.min() + 1e-6)
+        time_importance = (time_importance - time_importance.min()) / (time_importance.max() - time_importance.min() + 1e-6)
+        
+        predicted_class = predicted[0].item()
+        xai_data = {
             'grad_cam': {
                 'channel_importance': channel_importance.tolist(),
                 'channel_names': self.channel_names,
@@ -60,3 +82,16 @@ class XAIEngine:
                 for i in np.argsort(-channel_importance)[:5]
             ]
         }
+        if self.integrated_gradients is not None:
+            with self._lock:  # Same model and hooks as the pass above: one explanation at a time
+                xai_data['integrated_gradients'] = self.integrated_gradients.explain(eeg_tensor[0], predicted_class)
+        
+        return {
+            'predicted_class': predicted_class,
+            'class_name': CLASS_LABELS[predicted_class],
+            'confidence': float(confidence[0].item()),
+            'uncertainty': float(uncertainty[0].item()),
+            'probabilities': probs.detach()[:1].cpu().numpy().tolist(),
+            'inference_time_ms': (time.perf_counter_ns() - t_start) / 1e6,
+            'xai': xai_data
+        }
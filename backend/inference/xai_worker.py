@@ -0,0 +1,82 @@
+import queue
+import threading
+import numpy as np
+from config import XAI_SAMPLE_EVERY, XAI_QUEUE_SIZE
+from utils.metrics import stage_metrics
+
+class XAIWorker:
+    """
+    Background XAI stage, decoupled from the prediction loop
+    Trials are explained when sampled (every `sample_every`-th trial of a
+    session) or requested on demand. Explanations run on one background
+    thread; results are handed to `on_result` keyed by trial id. When the
+    queue is full, new requests are dropped rather than slowing predictions.
+    """
+    
+    def __init__(self, xai_engine, on_result, sample_every=XAI_SAMPLE_EVERY, max_queue=XAI_QUEUE_SIZE):
+        self.xai_engine = xai_engine
+        self.on_result = on_result
+        self.sample_every = sample_every
+        
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._requested = set()  # Sessions whose next trial should be explained
+        self._lock = threading.Lock()
+        self.explained = 0
+        self.dropped = 0
+        self.errors = 0
+        
+        self._thread = threading.Thread(target=self._run, name='xai-worker', daemon=True)
+        self._thread.start()
+    
+    def request(self, session_id):
+        """Explain the next trial of a session regardless of sampling"""
+        with self._lock:
+            self._requested.add(session_id)
+    
+    def should_explain(self, session_id, trial_number):
+        with self._lock:
+            if session_id in self._requested:
+                self._requested.discard(session_id)
+                return True
+        return bool(self.sample_every) and trial_number % self.sample_every == 0
+    
+    def submit(self, trial_id, session_id, sid, eeg_window, trial_number=None):
+        """Queue a window for explanation (copied: callers reuse their buffers)"""
+        job = {
+            'trial_id': trial_id,
+            'session_id': session_id,
+            'sid': sid,
+            'trial_number': trial_number,
+            'eeg': np.array(eeg_window, dtype=np.float32)
+        }
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+    
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with stage_metrics.time('xai'):
+                    xai_data = self.xai_engine.explain(job['eeg'][np.newaxis])
+                self.on_result(job, xai_data)
+                with self._lock:
+                    self.explained += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"[ERROR] XAI for trial {job['trial_id']} failed: {e}")
+    
+    def metrics(self):
+        with self._lock:
+            return {
+                'explained': self.explained,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'queue_depth': self._queue.qsize(),
+                'sample_every': self.sample_every
+            }
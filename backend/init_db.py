@@ -60,6 +60,12 @@ c.execute('''
     )
 ''')
 
+# Indexes
+c.execute('CREATE INDEX IF NOT EXISTS idx_trials_session ON trials (session_id, trial_id)')
+c.execute('CREATE INDEX IF NOT EXISTS idx_trials_timestamp ON trials (timestamp)')
+c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id, session_id)')
+c.execute('CREATE INDEX IF NOT EXISTS idx_xai_trial ON xai_results (trial_id)')
+
 conn.commit()
 conn.close()
 
@@ -0,0 +1,118 @@
+"""
+Optimized serving artifact for IFNetEnhanced
+
+The deterministic trunk (branches, fusion, log power, fc1) is exported as a
+frozen TorchScript module with BatchNorm folded into the preceding layer:
+    low_freq_spatial + low_freq_bn, high_freq_spatial + high_freq_bn,
+    interaction + fusion_bn, fc1 + fc_bn
+The head (fc2, MC Dropout) stays eager, so the loaded model keeps the
+forward_trunk / fc2 / mc_head API used by IFNetPredictor.
+int8 artifacts (models/quantization.py) use the same format; their head
+is dynamically quantized at load time.
+"""
+
+import copy
+import hashlib
+import json
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.ao.quantization import quantize_dynamic
+from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval
+
+FOLDED_LAYERS = [
+    ('low_freq_spatial', 'low_freq_bn'),
+    ('high_freq_spatial', 'high_freq_bn'),
+    ('interaction', 'fusion_bn'),
+    ('fc1', 'fc_bn'),
+]
+
+class _Trunk(nn.Module):
+    """forward_trunk as a module's forward, for tracing"""
+    def __init__(self, model):
+        super(_Trunk, self).__init__()
+        self.model = model
+    
+    def forward(self, x):
+        return self.model.forward_trunk(x)
+
+class OptimizedIFNet(nn.Module):
+    """Frozen TorchScript trunk + eager head, with IFNetEnhanced's serving API"""
+    
+    def __init__(self, trunk, fc2, dropout_p):
+        super(OptimizedIFNet, self).__init__()
+        self.trunk = trunk
+        self.fc2 = fc2
+        self.dropout = nn.Dropout(dropout_p)
+    
+    def forward_trunk(self, x):
+        return self.trunk(x)
+    
+    def forward(self, x):
+        return self.fc2(self.trunk(x))
+    
+    def mc_head(self, features, n_samples=10):
+        """Same as IFNetEnhanced.mc_head, through the fc2 module (may be quantized)"""
+        samples = features.unsqueeze(0).expand(n_samples, -1, -1)
+        return self.fc2(F.dropout(samples, p=self.dropout.p, training=True))
+
+def fold_batchnorm(model):
+    """Eval-mode copy of the model with BatchNorm folded into conv/linear weights"""
+    folded = copy.deepcopy(model).eval()
+    for layer_name, bn_name in FOLDED_LAYERS:
+        layer, bn = getattr(folded, layer_name), getattr(folded, bn_name)
+        fuse = fuse_conv_bn_eval if isinstance(layer, nn.Conv1d) else fuse_linear_bn_eval
+        setattr(folded, layer_name, fuse(layer, bn))
+        setattr(folded, bn_name, nn.Identity())
+    return folded
+
+def checkpoint_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def export_optimized(model, path, example_shape, source_digest=None):
+    """
+    Trace the folded trunk, freeze it and save to `path`
+    source_digest (checkpoint hash) is stored so stale artifacts can be detected
+    """
+    folded = fold_batchnorm(model).cpu()
+    return save_trunk(_Trunk(folded), path, example_shape, {
+        'source_digest': source_digest,
+        'dropout_p': model.dropout.p,
+        'folded_layers': [layer for layer, _ in FOLDED_LAYERS],
+        'precision': 'fp32'
+    })
+
+def save_trunk(trunk, path, example_shape, meta):
+    """Trace + freeze a trunk module and save it with its metadata"""
+    example = torch.randn(*example_shape)
+    with torch.no_grad():
+        traced = torch.jit.trace(trunk.eval(), example)
+    frozen = torch.jit.freeze(traced.eval())
+    if meta.get('precision', 'fp32') == 'fp32':
+        frozen = torch.jit.optimize_for_inference(frozen)
+    
+    meta = {**meta, 'example_shape': list(example_shape)}
+    torch.jit.save(frozen, path, _extra_files={'meta.json': json.dumps(meta)})
+    return frozen
+
+def load_optimized(path, model, device, source_digest=None):
+    """
+    Load the exported trunk and attach model's eager head
+    Returns None (caller falls back to the eager model) when the artifact was
+    exported from a different checkpoint.
+    """
+    extra_files = {'meta.json': ''}
+    trunk = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    meta = json.loads(extra_files['meta.json'])
+    
+    if source_digest is not None and meta.get('source_digest') != source_digest:
+        print(f"[WARNING] {path} was exported from a different checkpoint; ignoring it")
+        return None
+    
+    fc2 = model.fc2
+    if meta.get('precision') == 'int8':
+        torch.backends.quantized.engine = meta['backend']
+        fc2 = quantize_dynamic(nn.Sequential(copy.deepcopy(fc2).cpu()), {nn.Linear}, dtype=torch.qint8)[0]
+    
+    return OptimizedIFNet(trunk, fc2, meta.get('dropout_p', model.dropout.p)).eval()
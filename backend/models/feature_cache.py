@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+from config import (FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES, FEATURE_CACHE_LOW_WATER,
+                    FEATURE_CACHE_SHARD_ROWS)
+
+class FeatureCache:
+    """
+    On-disk feature store for FeatureExtractor.extract_multimodal_batch
+    
+    Entries are keyed by a hash of the epoch bytes (plus shape and dtype)
+    and the extractor parameters of one modality, so changing e.g. the
+    wavelet only recomputes the wavelet features. Rows computed together
+    are written as shards of up to shard_rows rows:
+    
+    <root>/<modality>/<params hash>/<shard>.rows.npy  (rows, n_features)
+    <root>/<modality>/<params hash>/<shard>.keys.npy  (rows,) epoch keys
+    
+    Shards are read back memory-mapped. The index (key -> shard, row) and the
+    LRU order of shards live in memory and are rebuilt from disk only at
+    startup. Once the store exceeds max_bytes, least recently used shards
+    are evicted down to low_water * max_bytes.
+    Several processes may share a root: shards written by another process
+    are seen after a restart, and shards it evicted count as misses.
+    """
+    
+    VERSION = 2  # Bump to invalidate entries after changing a feature engine
+    
+    def __init__(self, root=FEATURE_CACHE_DIR, max_bytes=FEATURE_CACHE_MAX_BYTES,
+                 low_water=FEATURE_CACHE_LOW_WATER, shard_rows=FEATURE_CACHE_SHARD_ROWS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.shard_rows = shard_rows
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        
+        os.makedirs(root, exist_ok=True)
+        self._entries = {}  # (group, epoch key) -> (shard, row)
+        self._shards = OrderedDict()  # shard -> (bytes, keys), least recently used first
+        self._bytes = 0
+        self._rescan()
+    
+    @staticmethod
+    def epoch_key(epoch):
+        """Content hash of one (channels, samples) epoch"""
+        epoch = np.ascontiguousarray(epoch)
+        digest = hashlib.sha1(epoch.data)
+        digest.update(f'{epoch.shape}{epoch.dtype.str}'.encode())
+        return digest.hexdigest()
+    
+    def _group(self, modality, params):
+        """Directory of one modality + parameter set, relative to root"""
+        spec = json.dumps({'v': self.VERSION, 'params': params}, sort_keys=True, default=str)
+        return os.path.join(modality, hashlib.sha1(spec.encode()).hexdigest()[:16])
+    
+    def get(self, modality, epoch_key, params):
+        """Memory-mapped features of one epoch, or None on a miss"""
+        return self.get_many(modality, [epoch_key], params)[0]
+    
+    def get_many(self, modality, epoch_keys, params):
+        """Cached rows (None on a miss); each shard is opened once"""
+        group = self._group(modality, params)
+        with self._lock:
+            located = [self._entries.get((group, key)) for key in epoch_keys]
+        
+        rows = [None] * len(epoch_keys)
+        shards = {}
+        for i, entry in enumerate(located):
+            if entry is None:
+                continue
+            shard, row = entry
+            if shard not in shards:
+                shards[shard] = self._open(shard)
+            if shards[shard] is not None:
+                rows[i] = shards[shard][row]
+        
+        for shard, data in shards.items():
+            if data is not None:
+                self._touch(shard)
+        n_hits = sum(row is not None for row in rows)
+        self._count(self.hits, modality, n_hits)
+        self._count(self.misses, modality, len(rows) - n_hits)
+        return rows
+    
+    def put(self, modality, epoch_key, params, features):
+        self.put_many(modality, [epoch_key], params, [features])
+    
+    def put_many(self, modality, epoch_keys, params, rows):
+        """Store rows computed together, shard_rows rows per shard file"""
+        group = self._group(modality, params)
+        os.makedirs(os.path.join(self.root, group), exist_ok=True)
+        
+        for start in range(0, len(epoch_keys), self.shard_rows):
+            keys = list(epoch_keys[start:start + self.shard_rows])
+            shard = os.path.join(group, uuid.uuid4().hex)
+            size = self._write(shard, keys, np.stack([np.asarray(r) for r in rows[start:start + self.shard_rows]]))
+            
+            with self._lock:
+                self._shards[shard] = (size, keys)
+                self._bytes += size
+                for row, key in enumerate(keys):
+                    self._entries[(group, key)] = (shard, row)
+                over_budget = self._bytes > self.max_bytes
+            
+            if over_budget:
+                self.evict(int(self.max_bytes * self.low_water))
+    
+    def get_or_compute(self, modality, epochs, epoch_keys, params, compute):
+        """
+        Features for every epoch: cached rows are reused and `compute` runs
+        once, batched, on the epochs that missed. `compute` returns the
+        features, or (features, mask) where mask marks the rows that may be
+        cached (e.g. not a fallback value)
+        """
+        rows = self.get_many(modality, epoch_keys, params)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        
+        if missing:
+            computed = compute(epochs[missing])
+            cacheable = np.ones(len(missing), dtype=bool)
+            if isinstance(computed, tuple):
+                computed, cacheable = computed
+            for i, features in zip(missing, computed):
+                rows[i] = features
+            
+            store = [i for i, ok in zip(missing, cacheable) if ok]
+            if store:
+                self.put_many(modality, [epoch_keys[i] for i in store], params, [rows[i] for i in store])
+        
+        return np.stack(rows)
+    
+    def evict(self, max_bytes=None):
+        """Delete least recently used shards until the store fits max_bytes"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = []
+        with self._lock:
+            while self._shards and self._bytes > max_bytes:
+                shard, (size, keys) = self._shards.popitem(last=False)
+                self._drop(shard, size, keys)
+                removed.append(shard)
+        for shard in removed:
+            self._remove_files(shard)
+    
+    def clear(self, modality=None):
+        """Drop every entry (or one modality's) so it is recomputed"""
+        removed = []
+        with self._lock:
+            for shard in list(self._shards):
+                if modality is None or shard.split(os.sep)[0] == modality:
+                    size, keys = self._shards.pop(shard)
+                    self._drop(shard, size, keys)
+                    removed.append(shard)
+        for shard in removed:
+            self._remove_files(shard)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'shards': len(self._shards),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': dict(self.hits),
+                'misses': dict(self.misses)
+            }
+    
+    def _paths(self, shard):
+        base = os.path.join(self.root, shard)
+        return base + '.rows.npy', base + '.keys.npy'
+    
+    def _write(self, shard, keys, rows):
+        """Atomic writes; keys go last, so a shard is complete once its keys exist"""
+        rows_path, keys_path = self._paths(shard)
+        for path, array in ((rows_path, rows), (keys_path, np.array(keys, dtype='S40'))):
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        return os.path.getsize(rows_path) + os.path.getsize(keys_path)
+    
+    def _open(self, shard):
+        try:
+            return np.load(self._paths(shard)[0], mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            # Evicted by another process sharing the root
+            with self._lock:
+                if shard in self._shards:
+                    size, keys = self._shards.pop(shard)
+                    self._drop(shard, size, keys)
+            return None
+    
+    def _drop(self, shard, size, keys):
+        # Caller holds self._lock
+        self._bytes -= size
+        group = os.path.dirname(shard)
+        for key in keys:
+            if self._entries.get((group, key), (None,))[0] == shard:
+                del self._entries[(group, key)]
+    
+    def _remove_files(self, shard):
+        for path in reversed(self._paths(shard)):  # Keys first: the shard stops being valid
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _count(self, counter, modality, n):
+        if n:
+            with self._lock:
+                counter[modality] = counter.get(modality, 0) + n
+    
+    def _touch(self, shard):
+        try:
+            os.utime(self._paths(shard)[1])  # LRU order across restarts
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if shard in self._shards:
+                self._shards.move_to_end(shard)
+    
+    def _rescan(self):
+        """Rebuild the index and LRU order from the shards on disk (startup only)"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith('.keys.npy'):
+                    continue
+                shard = os.path.relpath(os.path.join(dirpath, name[:-len('.keys.npy')]), self.root)
+                rows_path, keys_path = self._paths(shard)
+                try:
+                    keys = [key.decode() for key in np.load(keys_path)]
+                    size = os.path.getsize(rows_path) + os.path.getsize(keys_path)
+                    mtime = os.path.getmtime(keys_path)
+                except (FileNotFoundError, ValueError):
+                    continue
+                found.append((mtime, shard, size, keys))
+        
+        found.sort()
+        for _, shard, size, keys in found:
+            self._shards[shard] = (size, keys)
+            self._bytes += size
+            group = os.path.dirname(shard)
+            for row, key in enumerate(keys):
+                self._entries[(group, key)] = (shard, row)
@@ -1,7 +1,99 @@
+import os
+import signal as os_signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 import numpy as np
-from scipy import signal
+from scipy import signal, stats
+from scipy import fft as sp_fft
 from scipy.fft import fft
+from functools import lru_cache
+from math import floor
 import pywt
+from utils.constants import EEG_BANDS
+from utils.eeg_processor import design_bandpass
+from config import EMD_N_JOBS, EMD_MAX_ITERATION, EMD_JOB_TIMEOUT_S
+
+@lru_cache(maxsize=16)
+def _cwt_kernel_bank(wavelet, scales, n_samples, precision=12):
+    """
+    Frequency-domain CWT kernels for every scale, as built by pywt.cwt
+    (integrated wavelet resampled per scale, with the -sqrt(scale) factor
+    and the final np.diff folded into the kernel)
+    Returns (kernels (n_scales, n_freqs), trim starts (n_scales,), nfft, is_complex)
+    """
+    wavelet = pywt.DiscreteContinuousWavelet(wavelet)
+    integrated = pywt.integrate_wavelet(wavelet, precision=precision)
+    int_psi, x = integrated[-2], integrated[-1]  # Continuous: (psi, x); orthogonal: (phi, psi, x)
+    if getattr(wavelet, 'complex_cwt', False):
+        int_psi = np.conj(int_psi)
+    is_complex = np.iscomplexobj(int_psi)
+    
+    step = x[1] - x[0]
+    taps, starts = [], []
+    for scale in scales:
+        j = (np.arange(scale * (x[-1] - x[0]) + 1) / (scale * step)).astype(int)
+        j = j[j < int_psi.size]
+        kernel = int_psi[j][::-1]
+        if kernel.size < 2:
+            raise ValueError(f"Selected scale of {scale} too small.")
+        
+        # diff(conv(x, k)) == conv(x, diff([0, k, 0]))[1:-1]
+        taps.append(-np.sqrt(scale) * np.diff(np.concatenate([[0], kernel, [0]])))
+        starts.append(1 + floor((kernel.size - 2) / 2))
+    
+    nfft = sp_fft.next_fast_len(n_samples + max(t.size for t in taps) - 1)
+    transform = sp_fft.fft if is_complex else sp_fft.rfft
+    kernels = np.stack([transform(t, nfft) for t in taps])
+    
+    return kernels, np.array(starts), nfft, is_complex
+
+# EMD worker state: one reusable EMD instance per process
+_worker_emd = None
+
+class _EMDTimeout(Exception):
+    pass
+
+def _init_emd_worker(max_iteration=EMD_MAX_ITERATION):
+    global _worker_emd
+    from PyEMD import EMD
+    _worker_emd = EMD()
+    _worker_emd.MAX_ITERATION = max_iteration
+
+@contextmanager
+def _time_budget(seconds):
+    """Raise _EMDTimeout after `seconds` (SIGALRM, main thread only; no-op elsewhere)"""
+    if not seconds or not hasattr(os_signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def on_alarm(signum, frame):
+        raise _EMDTimeout()
+    
+    previous = os_signal.signal(os_signal.SIGALRM, on_alarm)
+    os_signal.setitimer(os_signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        os_signal.setitimer(os_signal.ITIMER_REAL, 0)
+        os_signal.signal(os_signal.SIGALRM, previous)
+
+def _emd_job(args):
+    """One (trial, channel) job -> (log IMF energies, completed); zeros if over budget"""
+    channel_signal, max_imf, timeout_s = args
+    try:
+        with _time_budget(timeout_s):
+            imfs = _worker_emd(channel_signal, max_imf=max_imf)[:max_imf]
+    except _EMDTimeout:
+        return np.zeros(max_imf), False
+    
+    # Pad if fewer IMFs
+    if len(imfs) < max_imf:
+        imfs = np.vstack([imfs, np.zeros((max_imf - len(imfs), channel_signal.shape[-1]))])
+    
+    # Mean energy per IMF
+    energy = np.mean(imfs ** 2, axis=1)
+    return np.log(energy + 1e-6), True
 
 class FeatureExtractor:
     """Extract multi-modal EEG features"""
@@ -13,30 +105,31 @@ class FeatureExtractor:
         Extract power in multiple frequency bands
         eeg_window: (channels, samples)
         """
+        return FeatureExtractor.frequency_features_batch(eeg_window[np.newaxis], fs, bands)[0]
+    
+    @staticmethod
+    def frequency_features_batch(epochs, fs=250, bands=None):
+        """
+        Vectorized filter bank: one zero-phase SOS pass per band over all
+        trials and channels at once (designs cached in design_bandpass)
+        epochs: (trials, channels, samples)
+        Returns (trials, n_bands * n_channels), band-major
+        """
         if bands is None:
-            bands = {'delta': (0.5, 4), 'theta': (4, 8), 'alpha': (8, 13),
-                    'beta': (13, 30), 'gamma': (30, 100)}
+            bands = EEG_BANDS
         
-        n_channels = eeg_window.shape[0]
-        features = []
+        epochs = np.asarray(epochs)
+        n_trials, n_channels = epochs.shape[:2]
+        features = np.empty((n_trials, len(bands), n_channels))
         
-        for band_name, (low, high) in bands.items():
-            # Butterworth filter
-            nyquist = fs / 2
-            low_norm = low / nyquist
-            high_norm = high / nyquist
-            b, a = signal.butter(4, [low_norm, high_norm], btype='band')
-            
-            # Filter each channel
-            filtered = np.zeros_like(eeg_window)
-            for ch in range(n_channels):
-                filtered[ch] = signal.filtfilt(b, a, eeg_window[ch])
+        for i, (low, high) in enumerate(bands.values()):
+            sos = design_bandpass(low, high, fs, 4)
+            filtered = signal.sosfiltfilt(sos, epochs, axis=-1)
             
             # Log power (like CSP)
-            power = np.log(np.var(filtered, axis=-1) + 1e-6)
-            features.append(power)
+            features[:, i] = np.log(np.var(filtered, axis=-1) + 1e-6)
         
-        return np.concatenate(features)  # (n_channels * n_bands,)
+        return features.reshape(n_trials, -1)  # (trials, n_bands * n_channels)
     
     @staticmethod
     def wavelet_features(eeg_window, fs=250, wavelet='db4', levels=5):
@@ -44,21 +137,35 @@ class FeatureExtractor:
         INNOVATION #2: Continuous Wavelet Transform (CWT) features
         More time-frequency resolution than simple bands
         """
-        n_channels = eeg_window.shape[0]
-        features = []
+        return FeatureExtractor.wavelet_features_batch(eeg_window[np.newaxis], fs, wavelet, levels)[0]
+    
+    @staticmethod
+    def wavelet_features_batch(epochs, fs=250, wavelet='db4', levels=5, chunk_size=64):
+        """
+        Batched CWT log power over (trials, channels, samples)
+        Same transform as pywt.cwt, but the kernels are built and
+        transformed once per (wavelet, scales, n_samples) and every
+        channel of every trial is convolved in one FFT product
+        Returns (trials, n_channels * levels), channel-major
+        """
+        epochs = np.asarray(epochs, dtype=np.float64)
+        n_trials, n_channels, n_samples = epochs.shape
+        scales = tuple(range(1, levels + 1))
+        kernels, starts, nfft, is_complex = _cwt_kernel_bank(wavelet, scales, n_samples)
         
-        scales = np.arange(1, levels + 1)
+        forward, inverse = (sp_fft.fft, sp_fft.ifft) if is_complex else (sp_fft.rfft, sp_fft.irfft)
+        index = (starts[:, np.newaxis] + np.arange(n_samples))[np.newaxis, np.newaxis]  # (1, 1, scales, samples)
         
-        for ch in range(n_channels):
-            # CWT using db4 wavelet
-            coefficients, frequencies = pywt.cwt(eeg_window[ch], scales, wavelet)
+        power = np.empty((n_trials, n_channels, levels))
+        for i in range(0, n_trials, chunk_size):
+            spectrum = forward(epochs[i:i + chunk_size], nfft, axis=-1)
+            coefficients = inverse(spectrum[:, :, np.newaxis, :] * kernels, nfft, axis=-1)
+            coefficients = np.take_along_axis(coefficients, index, axis=-1)
             
             # Mean power across time for each scale (frequency)
-            power = np.mean(np.abs(coefficients) ** 2, axis=1)
-            power_log = np.log(power + 1e-6)
-            features.append(power_log)
+            power[i:i + chunk_size] = np.mean(np.abs(coefficients) ** 2, axis=-1)
         
-        return np.concatenate(features)  # (n_channels * levels,)
+        return np.log(power + 1e-6).reshape(n_trials, -1)  # (trials, n_channels * levels)
     
     @staticmethod
     def emd_features(eeg_window, max_imf=5):
@@ -67,29 +174,47 @@ class FeatureExtractor:
         Adaptive, data-driven feature extraction
         Extract intrinsic mode functions (IMFs)
         """
+        return FeatureExtractor.emd_features_batch(eeg_window[np.newaxis], max_imf, n_jobs=1)[0]
+    
+    @staticmethod
+    def emd_features_batch(epochs, max_imf=5, n_jobs=EMD_N_JOBS,
+                           max_iteration=EMD_MAX_ITERATION, timeout_s=EMD_JOB_TIMEOUT_S,
+                           return_mask=False):
+        """
+        EMD log IMF energies for (trials, channels, samples)
+        Channel x trial jobs are spread over a process pool (n_jobs=None: all
+        cores, 1: in-process), each worker reusing one EMD instance. Sifting
+        is capped at max_iteration and each job at timeout_s seconds; jobs
+        over budget return zero features.
+        Returns (trials, n_channels * max_imf), plus with return_mask a
+        (trials,) bool mask of trials computed without any zero fallback
+        """
         try:
-            from PyEMD import EMD
+            import PyEMD  # noqa: F401
         except ImportError:
             print("PyEMD not installed, skipping EMD")
-            return np.zeros(eeg_window.shape[0] * max_imf)
+            features = np.zeros((len(epochs), epochs.shape[1] * max_imf))
+            return (features, np.zeros(len(epochs), dtype=bool)) if return_mask else features
         
-        n_channels = eeg_window.shape[0]
-        features = []
+        epochs = np.asarray(epochs, dtype=np.float64)
+        n_trials, n_channels = epochs.shape[:2]
+        jobs = [(channel_signal, max_imf, timeout_s) for channel_signal in epochs.reshape(n_trials * n_channels, -1)]
         
-        for ch in range(n_channels):
-            emd = EMD()
-            imfs = emd(eeg_window[ch])[:max_imf]
-            
-            # Pad if fewer IMFs
-            if len(imfs) < max_imf:
-                imfs = np.vstack([imfs, np.zeros((max_imf - len(imfs), eeg_window.shape[1]))])
-            
-            # Mean energy per IMF
-            energy = np.mean(imfs ** 2, axis=1)
-            energy_log = np.log(energy + 1e-6)
-            features.append(energy_log)
+        n_jobs = n_jobs or os.cpu_count()
+        if n_jobs == 1:
+            _init_emd_worker(max_iteration)
+            results = list(map(_emd_job, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_emd_worker,
+                                     initargs=(max_iteration,)) as pool:
+                chunksize = max(1, len(jobs) // (4 * n_jobs))
+                results = list(pool.map(_emd_job, jobs, chunksize=chunksize))
         
-        return np.concatenate(features)  # (n_channels * max_imf,)
+        features = np.stack([energy for energy, _ in results]).reshape(n_trials, n_channels * max_imf)
+        if return_mask:
+            completed = np.array([ok for _, ok in results]).reshape(n_trials, n_channels)
+            return features, completed.all(axis=1)
+        return features
     
     @staticmethod
     def temporal_features(eeg_window):
@@ -105,8 +230,8 @@ class FeatureExtractor:
             
             var = np.var(signal_ch)
             mean = np.mean(signal_ch)
-            skew = signal.skew(signal_ch)
-            kurt = signal.kurtosis(signal_ch)
+            skew = stats.skew(signal_ch)
+            kurt = stats.kurtosis(signal_ch)
             
             features.extend([var, mean, skew, kurt])
         
@@ -128,26 +253,51 @@ class FeatureExtractor:
         return corr_features  # (n_channels * (n_channels - 1) / 2,)
     
     @classmethod
-    def extract_multimodal(cls, eeg_window, fs=250):
+    def extract_multimodal(cls, eeg_window, fs=250, cache=None):
         """
         INNOVATION #6: Multi-modal fusion
         Concatenate all feature types
         """
-        freq_feat = cls.frequency_features(eeg_window, fs)
-        wav_feat = cls.wavelet_features(eeg_window, fs)
-        temporal_feat = cls.temporal_features(eeg_window)
-        spatial_feat = cls.spatial_features(eeg_window)
+        return cls.extract_multimodal_batch(eeg_window[np.newaxis], fs, n_jobs=1, cache=cache)[0]
+    
+    @classmethod
+    def extract_multimodal_batch(cls, epochs, fs=250, n_jobs=EMD_N_JOBS, cache=None,
+                                 bands=None, wavelet='db4', levels=5, max_imf=5):
+        """
+        Multi-modal features for (trials, channels, samples) using the
+        batched filter-bank, wavelet and parallel EMD engines
+        cache: optional FeatureCache; each modality is looked up separately
+        Returns (trials, n_features)
+        """
+        if bands is None:
+            bands = EEG_BANDS
+        epochs = np.asarray(epochs)
         
-        # Skip EMD if not available
-        try:
-            emd_feat = cls.emd_features(eeg_window)
-        except:
-            emd_feat = np.array([])
+        modalities = {
+            'frequency': ({'fs': fs, 'bands': sorted(bands.items())},
+                          lambda x: cls.frequency_features_batch(x, fs, bands)),
+            'wavelet': ({'wavelet': wavelet, 'levels': levels},
+                        lambda x: cls.wavelet_features_batch(x, fs, wavelet, levels)),
+            'emd': ({'max_imf': max_imf, 'max_iteration': EMD_MAX_ITERATION},
+                    # Rows that fell back to zeros (timeout) are returned but not cached
+                    lambda x: cls.emd_features_batch(x, max_imf, n_jobs=n_jobs, return_mask=cache is not None)),
+            'temporal': ({}, lambda x: np.stack([cls.temporal_features(w) for w in x])),
+            'spatial': ({}, lambda x: np.stack([cls.spatial_features(w) for w in x]))
+        }
+        epoch_keys = [cache.epoch_key(w) for w in epochs] if cache is not None else None
         
-        # Concatenate all
-        all_features = np.concatenate([feat for feat in 
-                                     [freq_feat, wav_feat, emd_feat, 
-                                      temporal_feat, spatial_feat] 
-                                     if len(feat) > 0])
+        features = []
+        for modality, (params, compute) in modalities.items():
+            try:
+                if cache is None:
+                    features.append(compute(epochs))
+                else:
+                    features.append(cache.get_or_compute(modality, epochs, epoch_keys, params, compute))
+            except Exception:
+                # Skip EMD if not available
+                if modality != 'emd':
+                    raise
+                features.append(np.empty((len(epochs), 0)))
         
-        return all_features
+        # Concatenate all
+        return np.concatenate(features, axis=1)
@@ -70,9 +70,10 @@ class IFNetEnhanced(nn.Module):
         # Uncertainty head (Bayesian MC Dropout)
         self.uncertainty_head = nn.Linear(128, n_classes)
     
-    def forward(self, x, return_features=False):
+    def forward_trunk(self, x):
         """
-        x: (batch, channels, samples)
+        Deterministic part of the network: both branches, fusion, log power
+        and fc1 -> (batch, 128) head features. Dropout only acts after this.
         """
         batch_size = x.size(0)
         
@@ -97,8 +98,15 @@ class IFNetEnhanced(nn.Module):
         fused = torch.log(torch.clamp(self.pool(fused ** 2), min=1e-6))
         fused = fused.view(batch_size, -1)  # (batch, 64)
         
+        return F.relu(self.fc_bn(self.fc1(fused)))  # (batch, 128)
+    
+    def forward(self, x, return_features=False):
+        """
+        x: (batch, channels, samples)
+        """
+        features = self.forward_trunk(x)
+        
         # Classification
-        features = F.relu(self.fc_bn(self.fc1(fused)))
         features_dropout = self.dropout(features)
         logits = self.fc2(features_dropout)
         
@@ -110,22 +118,30 @@ class IFNetEnhanced(nn.Module):
         
         return logits
     
+    def mc_head(self, features, n_samples=10):
+        """
+        MC Dropout over the classification head only.
+        Draws n_samples dropout masks over the 128-dim features and applies
+        fc2 to all of them as one batched matmul.
+        features: (batch, 128) from forward_trunk
+        Returns logits (n_samples, batch, n_classes)
+        """
+        samples = features.unsqueeze(0).expand(n_samples, -1, -1)
+        samples = F.dropout(samples, p=self.dropout.p, training=True)
+        return F.linear(samples, self.fc2.weight, self.fc2.bias)
+    
     def predict_with_uncertainty(self, x, n_samples=10):
-        """MC Dropout for uncertainty estimation"""
-        self.train()  # Enable dropout
-        
-        predictions = []
-        for _ in range(n_samples):
-            logits = self.forward(x)
-            predictions.append(F.softmax(logits, dim=1))
+        """MC Dropout for uncertainty estimation (trunk computed once)"""
+        was_training = self.training
+        self.eval()  # Frozen BatchNorm; dropout is applied by mc_head
         
-        self.eval()
+        features = self.forward_trunk(x)
+        preds = F.softmax(self.mc_head(features, n_samples), dim=-1)  # (n_samples, batch, n_classes)
         
-        # Stack predictions
-        preds = torch.stack(predictions)  # (n_samples, batch, n_classes)
+        self.train(was_training)
         
         # Mean and variance
         mean_pred = preds.mean(dim=0)  # (batch, n_classes)
         var_pred = preds.var(dim=0)    # (batch, n_classes)
         
-        return mean_pred, var_pred
\ No newline at end of file
+        return mean_pred, var_pred
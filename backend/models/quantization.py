@@ -0,0 +1,99 @@
+"""
+int8 inference mode for IFNetEnhanced (CPU serving)
+
+- Conv1d branches (spatial, temporal, interaction): static int8 via FX graph
+  mode, with activation ranges calibrated on recorded epochs. BatchNorm is
+  folded first (models/export.py).
+- fc1: dynamic int8 (weights int8, activations quantized per batch).
+- fc2: dynamic int8, applied at load time (models/export.py:load_optimized).
+  uncertainty_head is not part of the serving model (MC Dropout goes
+  through fc2), so it is not exported.
+ELU, SE attention and log-power pooling stay float: quantizing them costs
+more in requantization than it saves and loses precision in the log.
+"""
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QConfigMapping, get_default_qconfig, default_dynamic_qconfig
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from models.export import fold_batchnorm, save_trunk, _Trunk, FOLDED_LAYERS
+
+QUANTIZATION_BACKEND = 'x86'
+
+def explicit_padding(model):
+    """
+    Replace padding='same' convs (unsupported by quantized Conv1d) with an
+    equivalent pad + unpadded conv. Even kernels pad one more sample on the
+    right, as PyTorch's 'same' does.
+    """
+    for name, module in list(model.named_children()):
+        if isinstance(module, nn.Conv1d) and module.padding == 'same':
+            total = module.dilation[0] * (module.kernel_size[0] - 1)
+            left, right = total // 2, total - total // 2
+            conv = nn.Conv1d(module.in_channels, module.out_channels, module.kernel_size,
+                             stride=module.stride, padding=left if left == right else 0,
+                             dilation=module.dilation, groups=module.groups,
+                             bias=module.bias is not None)
+            conv.load_state_dict(module.state_dict())
+            setattr(model, name, conv if left == right else nn.Sequential(nn.ConstantPad1d((left, right), 0.0), conv))
+        else:
+            explicit_padding(module)
+    return model
+
+def quantize_trunk(model, calibration_epochs, backend=QUANTIZATION_BACKEND, batch_size=32):
+    """
+    int8 trunk of an eval-mode model
+    calibration_epochs: (n, channels, samples) array/tensor of recorded epochs
+    """
+    torch.backends.quantized.engine = backend
+    trunk = _Trunk(explicit_padding(fold_batchnorm(model).cpu())).eval()
+    
+    qconfig_mapping = (QConfigMapping()
+                       .set_object_type(nn.Conv1d, get_default_qconfig(backend))
+                       .set_module_name('model.fc1', default_dynamic_qconfig))
+    calibration_epochs = torch.as_tensor(calibration_epochs, dtype=torch.float32)
+    prepared = prepare_fx(trunk, qconfig_mapping, (calibration_epochs[:1],))
+    
+    with torch.no_grad():
+        for batch in torch.split(calibration_epochs, batch_size):
+            prepared(batch)
+    
+    return convert_fx(prepared)
+
+def export_quantized(model, calibration_epochs, path, example_shape, source_digest=None,
+                     backend=QUANTIZATION_BACKEND):
+    """Calibrate, quantize, trace and save the int8 trunk (loaded via load_optimized)"""
+    return save_trunk(quantize_trunk(model, calibration_epochs, backend), path, example_shape, {
+        'source_digest': source_digest,
+        'dropout_p': model.dropout.p,
+        'folded_layers': [layer for layer, _ in FOLDED_LAYERS],
+        'precision': 'int8',
+        'backend': backend,
+        'calibration_epochs': len(calibration_epochs)
+    })
+
+def accuracy_report(float_model, quantized_model, X, y, batch_size=64):
+    """Accuracy / agreement / logit error of the int8 model against the float model on held-out epochs"""
+    X = torch.as_tensor(X, dtype=torch.float32)
+    y = torch.as_tensor(y, dtype=torch.long)
+    float_logits, int8_logits = [], []
+    
+    with torch.no_grad():
+        for batch in torch.split(X, batch_size):
+            float_logits.append(float_model(batch))
+            int8_logits.append(quantized_model(batch))
+    float_logits, int8_logits = torch.cat(float_logits), torch.cat(int8_logits)
+    
+    float_pred, int8_pred = float_logits.argmax(dim=1), int8_logits.argmax(dim=1)
+    float_accuracy = (float_pred == y).float().mean().item()
+    int8_accuracy = (int8_pred == y).float().mean().item()
+    
+    return {
+        'n_epochs': len(y),
+        'float_accuracy': float_accuracy,
+        'int8_accuracy': int8_accuracy,
+        'accuracy_delta': int8_accuracy - float_accuracy,
+        'agreement': (float_pred == int8_pred).float().mean().item(),
+        'max_logit_error': (float_logits - int8_logits).abs().max().item(),
+        'max_prob_error': (float_logits.softmax(dim=1) - int8_logits.softmax(dim=1)).abs().max().item()
+    }
@@ -0,0 +1,66 @@
+"""
+Build the int8 inference model and report its accuracy against the float model
+Usage: python quantize_model.py <epochs.npz> [n_calibration]
+    epochs.npz: X (n_epochs, 22, 750) recorded epochs, y (n_epochs,) labels
+    The first n_calibration epochs (default 128) calibrate activation ranges;
+    the rest are the held-out set for the report.
+Serve it with INFERENCE_PRECISION = 'int8' in config.py.
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+import torch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import MODEL_PATH, QUANTIZED_MODEL_PATH, NUM_CHANNELS, NUM_CLASSES, WINDOW_SIZE
+from models.ifnet_enhanced import IFNetEnhanced
+from models.export import load_optimized, checkpoint_digest
+from models.quantization import export_quantized, accuracy_report
+
+print("=" * 60)
+print("BUILDING INT8 INFERENCE MODEL")
+print("=" * 60)
+
+if len(sys.argv) < 2:
+    sys.exit(__doc__)
+if not os.path.exists(MODEL_PATH):
+    sys.exit(f"No model found at {MODEL_PATH}. Run train_baseline.py first.")
+
+data = np.load(sys.argv[1])
+X, y = data['X'].astype(np.float32), data['y']
+n_calibration = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+if len(X) <= n_calibration:
+    sys.exit(f"Need more than {n_calibration} epochs (calibration + held-out), got {len(X)}")
+
+model = IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES)
+model.load_state_dict(torch.load(MODEL_PATH, map_location='cpu'))
+model.eval()
+
+print(f"\n[1/3] Calibrating on {n_calibration} epochs and quantizing...")
+digest = checkpoint_digest(MODEL_PATH)
+export_quantized(model, X[:n_calibration], QUANTIZED_MODEL_PATH, (1, NUM_CHANNELS, WINDOW_SIZE),
+                 source_digest=digest)
+quantized = load_optimized(QUANTIZED_MODEL_PATH, model, 'cpu', source_digest=digest)
+
+print(f"[2/3] Accuracy on {len(X) - n_calibration} held-out epochs...")
+report = accuracy_report(model, quantized, X[n_calibration:], y[n_calibration:])
+print(json.dumps(report, indent=2))
+
+print("[3/3] Benchmarking CPU latency...")
+for batch_size in [1, 32]:
+    window = torch.randn(batch_size, NUM_CHANNELS, WINDOW_SIZE)
+    for name, net in [('float', model), ('int8', quantized)]:
+        with torch.no_grad():
+            for _ in range(5):
+                net(window)
+            start = time.perf_counter()
+            for _ in range(20):
+                net(window)
+        print(f"batch {batch_size:>2} {name:>6}: {(time.perf_counter() - start) / 20 * 1000:.2f} ms")
+
+print(f"\n✅ Saved to: {QUANTIZED_MODEL_PATH}")
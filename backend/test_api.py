@@ -1,5 +1,8 @@
 import requests
 import json
+import numpy as np
+
+from utils.eeg_codec import RAW_CONTENT_TYPE, encode_raw
 
 BASE_URL = "http://localhost:5000"
 
@@ -7,7 +10,7 @@ print("Testing Backend API...")
 print("=" * 60)
 
 # Test 1: Health check
-print("\n[1/4] Testing /api/health")
+print("\n[1/5] Testing /api/health")
 try:
     resp = requests.get(f"{BASE_URL}/api/health")
     print(f"Status: {resp.status_code}")
@@ -16,7 +19,7 @@ except Exception as e:
     print(f"❌ Error: {e}")
 
 # Test 2: Create user
-print("\n[2/4] Testing POST /api/users")
+print("\n[2/5] Testing POST /api/users")
 try:
     data = {"name": "Test User", "age": 30, "condition": "healthy"}
     resp = requests.post(f"{BASE_URL}/api/users", json=data)
@@ -28,7 +31,7 @@ except Exception as e:
     print(f"❌ Error: {e}")
 
 # Test 3: Start session
-print("\n[3/4] Testing POST /api/sessions/start")
+print("\n[3/5] Testing POST /api/sessions/start")
 try:
     data = {"user_id": user_id}
     resp = requests.post(f"{BASE_URL}/api/sessions/start", json=data)
@@ -38,7 +41,7 @@ except Exception as e:
     print(f"❌ Error: {e}")
 
 # Test 4: Get users
-print("\n[4/4] Testing GET /api/users")
+print("\n[4/5] Testing GET /api/users")
 try:
     resp = requests.get(f"{BASE_URL}/api/users")
     print(f"Status: {resp.status_code}")
@@ -46,4 +49,15 @@ try:
 except Exception as e:
     print(f"❌ Error: {e}")
 
+# Test 5: Binary predict payload
+print("\n[5/5] Testing POST /api/predict (binary float32)")
+try:
+    eeg = np.random.randn(22, 750).astype(np.float32)
+    resp = requests.post(f"{BASE_URL}/api/predict", data=encode_raw(eeg),
+                         headers={"Content-Type": RAW_CONTENT_TYPE})
+    print(f"Status: {resp.status_code}")
+    print(f"Response: {resp.json()}")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
 print("\n✅ API tests complete!")
@@ -0,0 +1,127 @@
+"""
+Cross-subject data-parallel training over the epoch store (gloo, CPU)
+Usage:
+    python train_distributed.py [subjects] --workers 4           (one machine)
+    torchrun --nnodes N --nproc-per-node 4 ... train_distributed.py [subjects]
+    python train_distributed.py [subjects] --benchmark           (1/2/4/8 workers)
+    subjects: e.g. "1-20" (default: every subject built in the store)
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from sklearn.model_selection import train_test_split
+from torch.utils.data import ConcatDataset
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import MODEL_PATH, NUM_CHANNELS, NUM_CLASSES, TRAIN_EPOCHS
+from models.ifnet_enhanced import IFNetEnhanced
+from utils.epoch_store import EpochStore, EpochDataset, parse_subjects
+from training.trainer import Trainer, ChannelStats, Normalize, EEGAugment, TransformDataset
+from training.distributed import (init_process_group, cleanup, launch, sync_channel_stats,
+                                  threads_per_worker, is_main_process)
+
+def build_datasets(subjects, rank, world_size, repeat=1):
+    """Stratified split, per-channel stats merged across ranks, augmentation on train"""
+    store = EpochStore()
+    dataset = EpochDataset(store, subjects)
+    train_idx, test_idx = train_test_split(np.arange(len(dataset)), test_size=0.2,
+                                           random_state=42, stratify=dataset.labels)
+    train_set = EpochDataset(store, subjects, indices=train_idx)
+    test_set = EpochDataset(store, subjects, indices=test_idx)
+    
+    # One pass over this rank's shard; Welford partitions merge exactly
+    shard = EpochDataset(store, subjects, indices=train_idx[rank::world_size])
+    stats = sync_channel_stats(ChannelStats.from_dataset(shard, n_channels=NUM_CHANNELS))
+    normalize = Normalize(stats.mean, stats.std)
+    
+    train_set = TransformDataset(train_set, normalize, EEGAugment())
+    if repeat > 1:
+        train_set = ConcatDataset([train_set] * repeat)
+    return train_set, TransformDataset(test_set, normalize)
+
+def train(rank, world_size, subjects, epochs, checkpoint_path):
+    torch.manual_seed(0)  # Same initial weights on every rank
+    train_set, test_set = build_datasets(subjects, rank, world_size)
+    
+    trainer = Trainer(IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES), 'cpu')
+    result = trainer.fit(train_set, test_set, epochs=epochs, checkpoint_path=checkpoint_path)
+    
+    if is_main_process():
+        print(f"\n✅ Training complete on {world_size} workers!")
+        print(f"Best accuracy: {result['best_accuracy']:.4f} ({result['best_accuracy']*100:.1f}%)")
+        print(f"Model saved to: {checkpoint_path}")
+
+def benchmark_worker(rank, world_size, subjects, epochs, repeat, results):
+    torch.manual_seed(0)
+    train_set, _ = build_datasets(subjects, rank, world_size, repeat=repeat)
+    trainer = Trainer(IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES), 'cpu', num_workers=0)
+    loader = trainer.loader(train_set, shuffle=True)
+    
+    history = []
+    for epoch in range(epochs):
+        loader.sampler.set_epoch(epoch)
+        history.append(trainer.train_epoch(loader))
+    
+    if rank == 0:
+        # First epoch is warm-up
+        timed = history[1:] or history
+        results.put((world_size, float(np.mean([h['samples_per_s'] for h in timed]))))
+
+def benchmark(subjects, worker_counts, epochs, repeat):
+    print(f"[BENCH] {len(subjects)} subjects, {epochs} epochs per run (first is warm-up), "
+          f"train set x{repeat}, {os.cpu_count()} cores")
+    results = mp.get_context('spawn').SimpleQueue()
+    throughput = {}
+    for world_size in worker_counts:
+        start = time.time()
+        launch(benchmark_worker, world_size, subjects, epochs, repeat, results)
+        _, samples_per_s = results.get()
+        throughput[world_size] = samples_per_s
+        print(f"[BENCH] {world_size} workers ({threads_per_worker(world_size)} threads each): "
+              f"{samples_per_s:.0f} samples/s ({time.time() - start:.0f}s)")
+    
+    base = throughput[worker_counts[0]] / worker_counts[0]
+    print(f"\n{'workers':>8} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for world_size, samples_per_s in throughput.items():
+        speedup = samples_per_s / throughput[worker_counts[0]]
+        print(f"{world_size:>8} {samples_per_s:>10.0f} {speedup:>8.2f} "
+              f"{samples_per_s / (base * world_size):>10.0%}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Data-parallel training over the epoch store')
+    parser.add_argument('subjects', nargs='*')
+    parser.add_argument('--workers', type=int, default=2, help='local processes (ignored under torchrun)')
+    parser.add_argument('--epochs', type=int, default=TRAIN_EPOCHS)
+    parser.add_argument('--benchmark', action='store_true', help='samples/s at 1, 2, 4 and 8 workers')
+    parser.add_argument('--bench-workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--bench-epochs', type=int, default=3)
+    parser.add_argument('--bench-repeat', type=int, default=1, help='tile the train set for longer epochs')
+    args = parser.parse_args()
+    
+    subjects = parse_subjects(args.subjects) if args.subjects else EpochStore().subjects()
+    if not subjects:
+        sys.exit("No subjects in the epoch store. Run build_epoch_store.py first.")
+    
+    print("=" * 60)
+    print("DISTRIBUTED TRAINING" if not args.benchmark else "DISTRIBUTED SCALING BENCHMARK")
+    print("=" * 60)
+    
+    if args.benchmark:
+        benchmark(subjects, args.bench_workers, args.bench_epochs, args.bench_repeat)
+    elif 'WORLD_SIZE' in os.environ:
+        # Launched by torchrun: one process per rank, group from the environment
+        rank, world_size = init_process_group()
+        torch.set_num_threads(threads_per_worker(world_size))
+        try:
+            train(rank, world_size, subjects, args.epochs, MODEL_PATH)
+        finally:
+            cleanup()
+    else:
+        launch(train, args.workers, subjects, args.epochs, MODEL_PATH)
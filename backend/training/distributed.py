@@ -0,0 +1,68 @@
+"""
+Data-parallel training across CPU processes (gloo)
+
+Single machine: launch() spawns world_size processes that join one group.
+Several nodes: start each process with torchrun (or set RANK, WORLD_SIZE,
+MASTER_ADDR, MASTER_PORT) and call init_process_group() without arguments.
+Trainer picks the process group up automatically (training/trainer.py).
+"""
+
+import os
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from config import DDP_BACKEND, DDP_MASTER_ADDR, DDP_MASTER_PORT
+
+def init_process_group(rank=None, world_size=None, backend=DDP_BACKEND,
+                       master_addr=None, master_port=None):
+    """Join the process group; unset arguments come from torchrun-style env vars"""
+    rank = int(os.environ.get('RANK', 0)) if rank is None else rank
+    world_size = int(os.environ.get('WORLD_SIZE', 1)) if world_size is None else world_size
+    os.environ['MASTER_ADDR'] = master_addr or os.environ.get('MASTER_ADDR', DDP_MASTER_ADDR)
+    os.environ['MASTER_PORT'] = str(master_port or os.environ.get('MASTER_PORT', DDP_MASTER_PORT))
+    
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    return rank, world_size
+
+def cleanup():
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+def is_main_process():
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+def threads_per_worker(world_size, local_world_size=None):
+    """Split the node's cores between its workers so intra-op threads don't oversubscribe"""
+    local_world_size = local_world_size or int(os.environ.get('LOCAL_WORLD_SIZE', world_size))
+    return max(1, (os.cpu_count() or 1) // local_world_size)
+
+def sync_channel_stats(stats):
+    """Merge every rank's ChannelStats (computed on its shard) into global statistics"""
+    if not dist.is_initialized():
+        return stats
+    gathered = [None] * dist.get_world_size()
+    dist.all_gather_object(gathered, (stats.count, stats.mean, stats.m2))
+    
+    merged = type(stats)(len(stats.mean))
+    for count, mean, m2 in gathered:
+        merged.merge(count, mean, m2)
+    return merged
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+def _worker(rank, fn, world_size, port, args):
+    init_process_group(rank, world_size, master_addr=DDP_MASTER_ADDR, master_port=port)
+    torch.set_num_threads(threads_per_worker(world_size))
+    try:
+        fn(rank, world_size, *args)
+    finally:
+        cleanup()
+
+def launch(fn, world_size, *args, port=None):
+    """Run fn(rank, world_size, *args) in world_size local processes joined by gloo"""
+    port = port or free_port()
+    mp.spawn(_worker, args=(fn, world_size, port, args), nprocs=world_size, join=True)
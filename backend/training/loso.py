@@ -0,0 +1,182 @@
+"""
+Leave-one-subject-out (LOSO) evaluation over the epoch store
+
+Each fold trains on every other subject, then measures on the held-out one:
+accuracy and Cohen's kappa before and after DomainAdapter calibration on a
+few unlabelled trials, adaptation time and single-window inference latency.
+Folds run in parallel processes, one fold per worker, with intra-op threads
+pinned to cores // workers so workers don't oversubscribe the machine.
+"""
+
+import csv
+import os
+import time
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from sklearn.metrics import cohen_kappa_score
+from config import (NUM_CHANNELS, NUM_CLASSES, LOSO_WORKERS, LOSO_EPOCHS, LOSO_CALIBRATION_TRIALS,
+                    LOSO_ADAPT_ITERATIONS, LOSO_SOURCE_TRIALS, LOSO_LATENCY_WINDOWS, LOSO_RESULTS_DIR)
+from models.ifnet_enhanced import IFNetEnhanced
+from inference.predictor import IFNetPredictor
+from inference.domain_adapter import DomainAdapter
+from utils.epoch_store import EpochStore, EpochDataset
+from training.trainer import Trainer, ChannelStats, Normalize, EEGAugment, TransformDataset
+from training.distributed import threads_per_worker
+
+RESULT_COLUMNS = ['subject', 'n_train', 'n_test', 'accuracy', 'kappa', 'adapted_accuracy',
+                  'adapted_kappa', 'train_time_s', 'adaptation_time_s', 'latency_ms_p50',
+                  'latency_ms_mean']
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+def _init_fold_worker(n_threads):
+    torch.set_num_threads(n_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already fixed in this process
+
+def _stack(dataset, indices):
+    return torch.stack([dataset[i][0] for i in indices])
+
+def _predict(model, X, batch_size=256):
+    model.eval()
+    with torch.no_grad():
+        return torch.cat([model(batch).argmax(dim=1) for batch in torch.split(X, batch_size)]).numpy()
+
+def _scores(y_true, y_pred):
+    return float((y_true == y_pred).mean()), float(cohen_kappa_score(y_true, y_pred))
+
+def run_fold(test_subject, subjects, store, epochs=LOSO_EPOCHS,
+             calibration_trials=LOSO_CALIBRATION_TRIALS, adapt_iterations=LOSO_ADAPT_ITERATIONS,
+             source_trials=LOSO_SOURCE_TRIALS, latency_windows=LOSO_LATENCY_WINDOWS, seed=0):
+    """One fold: train without test_subject, score on it -> result row (RESULT_COLUMNS)"""
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    train_subjects = [s for s in subjects if s != test_subject]
+    
+    # Normalization from the training subjects only (one streaming pass)
+    train_set = EpochDataset(store, train_subjects)
+    stats = ChannelStats.from_dataset(train_set)
+    normalize = Normalize(stats.mean, stats.std)
+    test_set = TransformDataset(EpochDataset(store, [test_subject]), normalize)
+    
+    # Train (in-process loading: this worker already owns its cores)
+    model = IFNetEnhanced(n_channels=NUM_CHANNELS, n_classes=NUM_CLASSES)
+    trainer = Trainer(model, 'cpu', num_workers=0, log_every=epochs + 1)
+    start = time.perf_counter()
+    for _ in range(epochs):
+        trainer.train_epoch(trainer.loader(TransformDataset(train_set, normalize, EEGAugment()), shuffle=True))
+    train_time = time.perf_counter() - start
+    
+    # Held-out subject: the first trials calibrate, the rest are scored before/after
+    y_test = test_set.dataset.labels
+    n_calibration = min(calibration_trials, len(test_set) // 2)
+    calibration = _stack(test_set, range(n_calibration))
+    X_eval, y_eval = _stack(test_set, range(n_calibration, len(test_set))), y_test[n_calibration:]
+    accuracy, kappa = _scores(y_eval, _predict(model, X_eval))
+    
+    # Latency: single windows through the serving predictor
+    predictor = IFNetPredictor(model, 'cpu')
+    latencies = []
+    for i in range(min(latency_windows, len(X_eval))):
+        t0 = time.perf_counter()
+        predictor.predict(X_eval[i:i + 1].numpy())
+        latencies.append((time.perf_counter() - t0) * 1000)
+    
+    # DomainAdapter: MMD alignment of unlabelled calibration trials to training trials
+    source_idx = rng.choice(len(train_set), size=min(source_trials, len(train_set)), replace=False)
+    source = _stack(TransformDataset(train_set, normalize), source_idx)
+    adapter = DomainAdapter(model, source_domain_data=source)
+    start = time.perf_counter()
+    adapter.adapt_to_subject(calibration, n_iterations=adapt_iterations)
+    adaptation_time = time.perf_counter() - start
+    adapted_accuracy, adapted_kappa = _scores(y_eval, _predict(model, X_eval))
+    
+    return {
+        'subject': test_subject,
+        'n_train': len(train_set),
+        'n_test': len(y_eval),
+        'accuracy': accuracy,
+        'kappa': kappa,
+        'adapted_accuracy': adapted_accuracy,
+        'adapted_kappa': adapted_kappa,
+        'train_time_s': train_time,
+        'adaptation_time_s': adaptation_time,
+        'latency_ms_p50': float(np.median(latencies)) if latencies else float('nan'),
+        'latency_ms_mean': float(np.mean(latencies)) if latencies else float('nan')
+    }
+
+def run_loso(subjects, store=None, n_workers=LOSO_WORKERS, results_path=None, **fold_kwargs):
+    """
+    All folds, in parallel; rows are appended to the CSV results table as
+    folds finish, so a long sweep can be inspected (or resumed) midway
+    """
+    store = store or EpochStore()
+    subjects = sorted(subjects)
+    n_workers = max(1, min(n_workers or os.cpu_count(), len(subjects)))
+    n_threads = threads_per_worker(n_workers, n_workers)
+    
+    results_path = results_path or os.path.join(
+        LOSO_RESULTS_DIR, f"loso_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+    
+    done = set()
+    if os.path.exists(results_path):
+        with open(results_path, newline='') as f:
+            done = {int(row['subject']) for row in csv.DictReader(f)}
+    pending = [s for s in subjects if s not in done]
+    print(f"[LOSO] {len(subjects)} folds ({len(done)} already in {results_path}), "
+          f"{n_workers} workers x {n_threads} threads")
+    
+    # Spawned workers read thread limits from the environment at import time
+    saved_env = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: str(n_threads) for name in THREAD_ENV_VARS})
+    
+    rows = []
+    start = time.perf_counter()
+    try:
+        with open(results_path, 'a', newline='') as f, \
+                ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn'),
+                                    initializer=_init_fold_worker, initargs=(n_threads,)) as pool:
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            if f.tell() == 0:
+                writer.writeheader()
+            
+            futures = {pool.submit(run_fold, subject, subjects, store, **fold_kwargs): subject
+                       for subject in pending}
+            for future in as_completed(futures):
+                subject = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"[ERROR] LOSO fold S{subject:03d} failed: {e}")
+                    continue
+                writer.writerow(row)
+                f.flush()
+                rows.append(row)
+                print(f"[LOSO] {len(rows)}/{len(pending)} S{subject:03d}: accuracy {row['accuracy']:.3f} "
+                      f"(adapted {row['adapted_accuracy']:.3f}), kappa {row['kappa']:.3f}, "
+                      f"latency {row['latency_ms_p50']:.2f} ms, adaptation {row['adaptation_time_s']:.1f}s | "
+                      f"{time.perf_counter() - start:.0f}s elapsed")
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    
+    return results_path, sorted(rows, key=lambda row: row['subject'])
+
+def summarize(results_path):
+    """Mean of every metric over the folds in a results table"""
+    with open(results_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return {}
+    summary = {column: float(np.mean([float(row[column]) for row in rows]))
+               for column in RESULT_COLUMNS if column != 'subject'}
+    summary['folds'] = len(rows)
+    return summary
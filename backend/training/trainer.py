@@ -0,0 +1,286 @@
+import os
+import time
+import resource
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.nn.functional as F
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Dataset, DistributedSampler, Subset
+from config import (TRAIN_BATCH_SIZE, TRAIN_EPOCHS, TRAIN_LR, TRAIN_NUM_WORKERS, EVAL_BATCH_SIZE,
+                    TRAIN_AMP, TRAIN_COMPILE, TRAIN_CHANNELS_LAST, TRAIN_LOG_EVERY)
+
+class ChannelStats:
+    """
+    Per-channel mean/std of (channels, samples) epochs in one streaming pass
+    Batches are merged with Chan et al.'s parallel update of Welford's
+    algorithm (float64), so the dataset is never copied or held in memory.
+    """
+    
+    def __init__(self, n_channels):
+        self.count = 0
+        self.mean = np.zeros(n_channels)
+        self.m2 = np.zeros(n_channels)
+    
+    def update(self, batch):
+        """batch: (batch, channels, samples) tensor or array"""
+        batch = torch.as_tensor(batch).double()
+        batch_mean = batch.mean(dim=(0, 2)).numpy()
+        batch_m2 = ((batch - torch.from_numpy(batch_mean)[:, None]) ** 2).sum(dim=(0, 2)).numpy()
+        self.merge(batch.shape[0] * batch.shape[2], batch_mean, batch_m2)
+    
+    def merge(self, count, mean, m2):
+        """Combine with statistics of another partition (batch, shard, rank)"""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+    
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / max(self.count, 1))
+    
+    @classmethod
+    def from_dataset(cls, dataset, batch_size=EVAL_BATCH_SIZE, num_workers=0, n_channels=None):
+        """
+        Statistics of a whole dataset; an empty dataset raises ValueError unless
+        n_channels is given (e.g. an empty shard, merged with other ranks)
+        """
+        if len(dataset) == 0:
+            if n_channels is None:
+                raise ValueError('ChannelStats.from_dataset: empty dataset')
+            return cls(n_channels)
+        
+        loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers)
+        stats = None
+        for x, _ in loader:
+            if stats is None:
+                stats = cls(x.shape[1])
+            stats.update(x)
+        return stats
+
+class Normalize:
+    """Per-channel standardization with precomputed ChannelStats"""
+    
+    def __init__(self, mean, std, eps=1e-6):
+        self.mean = torch.as_tensor(mean, dtype=torch.float32)[:, None]
+        self.std = torch.as_tensor(std, dtype=torch.float32)[:, None] + eps
+    
+    def __call__(self, x):
+        return (x - self.mean) / self.std
+
+class EEGAugment:
+    """
+    On-the-fly augmentation of one (channels, samples) epoch
+    Random circular time shift, amplitude scaling, Gaussian noise and
+    channel dropout. Runs in DataLoader workers and returns a new tensor.
+    """
+    
+    def __init__(self, max_shift=25, scale_range=(0.9, 1.1), noise_std=0.05, channel_dropout=0.05):
+        self.max_shift = max_shift
+        self.scale_range = scale_range
+        self.noise_std = noise_std
+        self.channel_dropout = channel_dropout
+    
+    def __call__(self, x):
+        if self.max_shift:
+            x = torch.roll(x, int(torch.randint(-self.max_shift, self.max_shift + 1, ())), dims=-1)
+        low, high = self.scale_range
+        x = x * (low + (high - low) * torch.rand(()))
+        if self.noise_std:
+            x = x + self.noise_std * torch.randn_like(x)
+        if self.channel_dropout:
+            x = x * (torch.rand(x.shape[0], 1) >= self.channel_dropout)
+        return x
+
+class TransformDataset(Dataset):
+    """Applies transforms to the epochs of another (epoch, label) dataset"""
+    
+    def __init__(self, dataset, *transforms):
+        self.dataset = dataset
+        self.transforms = [t for t in transforms if t is not None]
+    
+    def __len__(self):
+        return len(self.dataset)
+    
+    def __getitem__(self, index):
+        x, y = self.dataset[index]
+        for transform in self.transforms:
+            x = transform(x)
+        return x, y
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of finished child processes (MB)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+class Trainer:
+    """
+    Mini-batch training of IFNetEnhanced from any (epoch, label) dataset
+    - DataLoader with shuffling, worker processes and pinned memory (CUDA)
+    - chunked evaluation (EVAL_BATCH_SIZE windows per forward)
+    - optional AMP (float16 + GradScaler on CUDA, bfloat16 on CPU),
+      torch.compile and channels-last
+    - data-parallel when a process group is initialized (training/distributed.py):
+      DDP gradient all-reduce, DistributedSampler shards, evaluation split
+      across ranks and all-reduced, checkpoints and logs on rank 0 only
+    Logs train steps/s and peak RSS per epoch.
+    """
+    
+    def __init__(self, model, device, lr=TRAIN_LR, batch_size=TRAIN_BATCH_SIZE,
+                 num_workers=TRAIN_NUM_WORKERS, amp=TRAIN_AMP, compile=TRAIN_COMPILE,
+                 channels_last=TRAIN_CHANNELS_LAST, log_every=TRAIN_LOG_EVERY):
+        self.device = torch.device(device)
+        self.model = model.to(self.device)
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.log_every = log_every
+        self.distributed = dist.is_available() and dist.is_initialized()
+        self.rank = dist.get_rank() if self.distributed else 0
+        self.world_size = dist.get_world_size() if self.distributed else 1
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
+        
+        self.memory_format = None
+        if channels_last:
+            # channels_last is defined for 4D (N, C, H, W) tensors; IFNet's Conv1d inputs are 3D
+            if any(p.dim() == 4 for p in self.model.parameters()):
+                self.memory_format = torch.channels_last
+                self.model = self.model.to(memory_format=self.memory_format)
+            else:
+                print("[WARNING] channels_last needs 4D conv weights; ignored for this Conv1d model")
+        
+        self.amp = amp
+        self.amp_dtype = torch.float16 if self.device.type == 'cuda' else torch.bfloat16
+        self.scaler = _grad_scaler(enabled=amp and self.device.type == 'cuda')
+        
+        # Wrapped (DDP) / compiled module for steps; state_dict comes from self.model
+        self.step_model = self.model
+        if self.distributed:
+            # static_graph: uncertainty_head never reaches the loss, and the
+            # unused set is fixed, so no per-step unused-parameter search
+            self.step_model = DistributedDataParallel(
+                self.model, device_ids=[self.device.index] if self.device.type == 'cuda' else None,
+                static_graph=True)
+        if compile:
+            self.step_model = torch.compile(self.step_model)
+    
+    def loader(self, dataset, shuffle, batch_size=None, persistent=False):
+        batch_size = batch_size or self.batch_size
+        sampler = None
+        if shuffle and self.distributed:
+            sampler = DistributedSampler(dataset, num_replicas=self.world_size, rank=self.rank, shuffle=True)
+        n_samples = len(sampler) if sampler is not None else len(dataset)
+        
+        return DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=shuffle and sampler is None,
+            sampler=sampler,
+            num_workers=self.num_workers,
+            pin_memory=self.device.type == 'cuda',
+            persistent_workers=persistent and self.num_workers > 0,
+            drop_last=shuffle and n_samples > batch_size  # Keep BatchNorm batches > 1
+        )
+    
+    def _to_device(self, x, y):
+        x = x.to(self.device, non_blocking=True)
+        if self.memory_format is not None:
+            x = x.contiguous(memory_format=self.memory_format)
+        return x, y.to(self.device, non_blocking=True)
+    
+    def train_epoch(self, loader):
+        self.step_model.train()
+        total_loss, steps, samples = 0.0, 0, 0
+        start = time.perf_counter()
+        
+        for x, y in loader:
+            x, y = self._to_device(x, y)
+            self.optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(self.device.type, dtype=self.amp_dtype, enabled=self.amp):
+                loss = F.cross_entropy(self.step_model(x), y)
+            self.scaler.scale(loss).backward()
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+            
+            total_loss += loss.item() * len(y)
+            samples += len(y)
+            steps += 1
+        
+        elapsed = time.perf_counter() - start
+        if self.distributed:
+            # Global throughput: samples of all ranks over the slowest rank's time
+            totals = torch.tensor([total_loss, samples], dtype=torch.float64)
+            dist.all_reduce(totals)
+            elapsed_max = torch.tensor([elapsed], dtype=torch.float64)
+            dist.all_reduce(elapsed_max, op=dist.ReduceOp.MAX)
+            total_loss, samples, elapsed = totals[0].item(), int(totals[1].item()), elapsed_max.item()
+        
+        return {
+            'loss': total_loss / max(samples, 1),
+            'steps': steps,  # Per rank
+            'steps_per_s': steps / elapsed if elapsed else 0.0,
+            'samples_per_s': samples / elapsed if elapsed else 0.0
+        }
+    
+    def evaluate(self, dataset, batch_size=EVAL_BATCH_SIZE):
+        """Loss/accuracy over a dataset, batch_size windows per forward"""
+        self.step_model.eval()
+        total_loss, correct, samples = 0.0, 0, 0
+        if self.distributed:
+            # Disjoint, unpadded shard per rank; totals are all-reduced below
+            dataset = Subset(dataset, range(self.rank, len(dataset), self.world_size))
+        
+        with torch.no_grad():
+            for x, y in self.loader(dataset, shuffle=False, batch_size=batch_size):
+                x, y = self._to_device(x, y)
+                with torch.autocast(self.device.type, dtype=self.amp_dtype, enabled=self.amp):
+                    logits = self.step_model(x)
+                total_loss += F.cross_entropy(logits.float(), y, reduction='sum').item()
+                correct += (logits.argmax(dim=1) == y).sum().item()
+                samples += len(y)
+        
+        if self.distributed:
+            totals = torch.tensor([total_loss, correct, samples], dtype=torch.float64)
+            dist.all_reduce(totals)
+            total_loss, correct, samples = totals.tolist()
+        
+        return {'loss': total_loss / max(samples, 1), 'accuracy': correct / max(samples, 1)}
+    
+    def fit(self, train_dataset, val_dataset, epochs=TRAIN_EPOCHS, checkpoint_path=None):
+        """Train; the best validation accuracy state is saved to checkpoint_path"""
+        train_loader = self.loader(train_dataset, shuffle=True, persistent=True)
+        history = []
+        best_accuracy = -1.0
+        
+        for epoch in range(epochs):
+            if self.distributed:
+                train_loader.sampler.set_epoch(epoch)  # Different shuffle each epoch, same across ranks
+            train_metrics = self.train_epoch(train_loader)
+            val_metrics = self.evaluate(val_dataset)
+            own_rss, children_rss = peak_rss_mb()
+            history.append({'epoch': epoch + 1, **train_metrics,
+                            'val_loss': val_metrics['loss'], 'val_accuracy': val_metrics['accuracy'],
+                            'peak_rss_mb': own_rss, 'peak_worker_rss_mb': children_rss})
+            
+            if val_metrics['accuracy'] > best_accuracy:
+                best_accuracy = val_metrics['accuracy']
+                if checkpoint_path and self.rank == 0:
+                    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+                    torch.save(self.model.state_dict(), checkpoint_path)
+            
+            if self.rank == 0 and ((epoch + 1) % self.log_every == 0 or epoch + 1 == epochs):
+                print(f"Epoch {epoch+1}/{epochs} - Loss: {train_metrics['loss']:.4f}, "
+                      f"Val accuracy: {val_metrics['accuracy']:.4f}, "
+                      f"{train_metrics['steps_per_s']:.1f} steps/s, "
+                      f"{train_metrics['samples_per_s']:.0f} samples/s, peak RSS {own_rss:.0f} MB")
+        
+        return {'best_accuracy': best_accuracy, 'history': history}
+
+def _grad_scaler(enabled):
+    if hasattr(torch.amp, 'GradScaler'):
+        return torch.amp.GradScaler('cuda', enabled=enabled)
+    return torch.cuda.amp.GradScaler(enabled=enabled)  # torch < 2.3
@@ -1,104 +1,341 @@
 import sqlite3
 import os
-from datetime import datetime
+import json
+import queue
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from config import DB_POOL_SIZE, DB_BATCH_SIZE, DB_FLUSH_INTERVAL_MS, DB_WRITE_RETRIES
+from utils.metrics import stage_metrics
+
+_STOP = object()
 
 class Database:
-    def __init__(self, db_path):
+    """
+    SQLite persistence with long-lived pooled connections (WAL mode)
+    Trial rows are queued and written by a background thread in batched
+    executemany transactions, every `batch_size` rows or
+    `flush_interval_ms`, whichever comes first. Call flush() to wait for
+    everything queued so far (e.g. at session end). A batch that still
+    fails after `write_retries` attempts is dropped and its trial ids are
+    kept in failed_trial_ids(); flush() then returns False.
+    Trial ids are allocated in-process, so one server process should own
+    the database file for writing.
+    """
+    
+    def __init__(self, db_path, pool_size=DB_POOL_SIZE, batch_size=DB_BATCH_SIZE,
+                 flush_interval_ms=DB_FLUSH_INTERVAL_MS, write_retries=DB_WRITE_RETRIES):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.write_retries = write_retries
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.init_db()
-    
-    def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
         
-        # Users table
-        c.execute('''CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            age INTEGER,
-            condition TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._pool_created = 0
+        self._pool_lock = threading.Lock()
         
-        # Sessions table
-        c.execute('''CREATE TABLE IF NOT EXISTS sessions (
-            session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            num_trials INTEGER DEFAULT 0,
-            avg_accuracy REAL DEFAULT 0,
-            notes TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )''')
+        self.init_db()
         
-        # Trials table
-        c.execute('''CREATE TABLE IF NOT EXISTS trials (
-            trial_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id INTEGER NOT NULL,
-            true_label INTEGER DEFAULT -1,
-            predicted_label INTEGER,
-            confidence REAL,
-            uncertainty REAL DEFAULT 0,
-            inference_time REAL DEFAULT 0,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions(session_id)
-        )''')
+        with self._connection() as conn:
+            max_trial_id = conn.execute('SELECT MAX(trial_id) FROM trials').fetchone()[0]
+        self._next_trial_id = (max_trial_id or 0) + 1
+        self._trial_id_lock = threading.Lock()
         
-        # XAI results table
-        c.execute('''CREATE TABLE IF NOT EXISTS xai_results (
-            xai_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            trial_id INTEGER NOT NULL,
-            important_channels TEXT,
-            time_importance TEXT,
-            frequency_importance TEXT,
-            FOREIGN KEY (trial_id) REFERENCES trials(trial_id)
-        )''')
+        self._pending = queue.Queue()
+        self._failed_trial_ids = set()
+        self._failed_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+    
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # Durable at checkpoints; no fsync per commit in WAL
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection; commits on success, rolls back on error"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._pool_created < self._pool_size
+                if create:
+                    self._pool_created += 1
+            conn = self._open() if create else self._pool.get()
         
-        conn.commit()
-        conn.close()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._pool.put(conn)
+    
+    def init_db(self):
+        with self._connection() as conn:
+            c = conn.cursor()
+            
+            # Users table
+            c.execute('''CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                age INTEGER,
+                condition TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''')
+            
+            # Sessions table
+            c.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                num_trials INTEGER DEFAULT 0,
+                avg_accuracy REAL DEFAULT 0,
+                notes TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )''')
+            
+            # Trials table
+            c.execute('''CREATE TABLE IF NOT EXISTS trials (
+                trial_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id INTEGER NOT NULL,
+                true_label INTEGER DEFAULT -1,
+                predicted_label INTEGER,
+                confidence REAL,
+                uncertainty REAL DEFAULT 0,
+                inference_time REAL DEFAULT 0,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+            )''')
+            
+            # XAI results table
+            c.execute('''CREATE TABLE IF NOT EXISTS xai_results (
+                xai_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trial_id INTEGER NOT NULL,
+                important_channels TEXT,
+                time_importance TEXT,
+                frequency_importance TEXT,
+                FOREIGN KEY (trial_id) REFERENCES trials(trial_id)
+            )''')
+            
+            # Indexes for per-session / per-user history queries
+            c.execute('CREATE INDEX IF NOT EXISTS idx_trials_session ON trials (session_id, trial_id)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_trials_timestamp ON trials (timestamp)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id, session_id)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_xai_trial ON xai_results (trial_id)')
     
     def create_user(self, name, age, condition):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('INSERT INTO users (name, age, condition) VALUES (?, ?, ?)',
-                  (name, age, condition))
-        conn.commit()
-        user_id = c.lastrowid
-        conn.close()
-        return user_id
+        with self._connection() as conn:
+            c = conn.execute('INSERT INTO users (name, age, condition) VALUES (?, ?, ?)',
+                             (name, age, condition))
+            return c.lastrowid
     
     def create_session(self, user_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('INSERT INTO sessions (user_id) VALUES (?)', (user_id,))
-        conn.commit()
-        session_id = c.lastrowid
-        conn.close()
-        return session_id
-    
-    def create_trial(self, session_id, predicted_label, confidence, true_label=-1):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''INSERT INTO trials (session_id, predicted_label, confidence, true_label)
-                     VALUES (?, ?, ?, ?)''',
-                  (session_id, predicted_label, confidence, true_label))
-        conn.commit()
+        with self._connection() as conn:
+            c = conn.execute('INSERT INTO sessions (user_id) VALUES (?)', (user_id,))
+            return c.lastrowid
+    
+    def create_trial(self, session_id, predicted_label, confidence, true_label=-1,
+                     uncertainty=0, inference_time=0):
+        """Queue a trial row for the background writer; returns its trial_id"""
+        with self._trial_id_lock:
+            trial_id = self._next_trial_id
+            self._next_trial_id += 1
+        
+        self._pending.put((trial_id, session_id, predicted_label, confidence, true_label,
+                           uncertainty, inference_time,
+                           time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())))  # Same format as CURRENT_TIMESTAMP
+        return trial_id
+    
+    def create_xai_result(self, trial_id, important_channels, time_importance=None,
+                          frequency_importance=None):
+        """Store an explanation for a trial (JSON-encoded columns)"""
+        with self._connection() as conn:
+            c = conn.execute('''INSERT INTO xai_results (trial_id, important_channels,
+                                time_importance, frequency_importance) VALUES (?, ?, ?, ?)''',
+                             (trial_id, json.dumps(important_channels),
+                              json.dumps(time_importance) if time_importance is not None else None,
+                              json.dumps(frequency_importance) if frequency_importance is not None else None))
+            return c.lastrowid
+    
+    def get_xai_result(self, trial_id):
+        """Latest explanation stored for a trial, or None"""
+        with self._connection() as conn:
+            row = conn.execute('''SELECT important_channels, time_importance, frequency_importance
+                                  FROM xai_results WHERE trial_id = ?
+                                  ORDER BY xai_id DESC LIMIT 1''', (trial_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'trial_id': trial_id,
+            'important_channels': json.loads(row[0]) if row[0] else None,
+            'time_importance': json.loads(row[1]) if row[1] else None,
+            'frequency_importance': json.loads(row[2]) if row[2] else None
+        }
+    
+    def flush(self, timeout=None):
+        """
+        Block until every trial queued before this call has been written
+        Returns False on timeout or if any trial failed to commit
+        (after close() it returns at once: the writer has drained the queue)
+        """
+        if self._writer.is_alive():
+            done = threading.Event()
+            self._pending.put(done)
+            if not done.wait(timeout):
+                return False
+        with self._failed_lock:
+            return not self._failed_trial_ids
+    
+    def failed_trial_ids(self):
+        """Trial ids handed out by create_trial whose rows could not be written"""
+        with self._failed_lock:
+            return sorted(self._failed_trial_ids)
+    
+    def _write_loop(self):
+        conn = self._open()
+        stopping = False
+        while not stopping:
+            rows, waiters = [], []
+            item = self._pending.get()
+            deadline = time.monotonic() + self.flush_interval
+            
+            # Collect until batch_size rows, the flush interval, or an explicit flush/stop
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                rows.append(item)
+                if len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if rows:
+                self._write_trials(conn, rows)
+            
+            for waiter in waiters:
+                waiter.set()
         conn.close()
     
+    def _write_trials(self, conn, rows):
+        """One executemany transaction, retried (e.g. database locked) before giving up"""
+        for attempt in range(1, self.write_retries + 1):
+            try:
+                with stage_metrics.time('db_write'), conn:
+                    conn.executemany('''INSERT INTO trials (trial_id, session_id, predicted_label,
+                                        confidence, true_label, uncertainty, inference_time, timestamp)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+                return True
+            except sqlite3.Error as e:
+                if attempt < self.write_retries:
+                    print(f"[WARNING] Failed to write {len(rows)} trials (attempt {attempt}): {e}")
+                    time.sleep(self.flush_interval * attempt)
+                else:
+                    print(f"[ERROR] Failed to write {len(rows)} trials: {e}")
+        
+        with self._failed_lock:
+            self._failed_trial_ids.update(row[0] for row in rows)
+        return False
+    
+    def close(self):
+        """Flush queued trials, stop the writer and close pooled connections"""
+        if not self._writer.is_alive():
+            return
+        self._pending.put(_STOP)
+        self._writer.join()
+        
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
     def get_all_users(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('SELECT user_id, name, age, condition FROM users')
-        users = [{'user_id': row, 'name': row, 'age': row, 'condition': row} 
-                 for row in c.fetchall()]
-        conn.close()
+        with self._connection() as conn:
+            c = conn.execute('SELECT user_id, name, age, condition FROM users')
+            users = [{'user_id': row[0], 'name': row[1], 'age': row[2], 'condition': row[3]}
+                     for row in c.fetchall()]
         return users
     
     def update_session(self, session_id, num_trials, avg_accuracy):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('UPDATE sessions SET num_trials = ?, avg_accuracy = ? WHERE session_id = ?',
-                  (num_trials, avg_accuracy, session_id))
-        conn.commit()
-        conn.close()
+        with self._connection() as conn:
+            conn.execute('UPDATE sessions SET num_trials = ?, avg_accuracy = ? WHERE session_id = ?',
+                         (num_trials, avg_accuracy, session_id))
+    
+    def get_session_trials(self, session_id, after=None, before=None, limit=100):
+        """
+        Keyset-paginated trial history of a session
+        after: trial_id cursor, oldest first; before: trial_id cursor, newest first
+        (neither: newest first from the latest trial)
+        """
+        self.flush()  # Read our own queued writes
+        if after is not None:
+            where, order, cursor = 'AND trial_id > ?', 'ASC', (after,)
+        elif before is not None:
+            where, order, cursor = 'AND trial_id < ?', 'DESC', (before,)
+        else:
+            where, order, cursor = '', 'DESC', ()
+        
+        with self._connection() as conn:
+            c = conn.execute(f'''SELECT trial_id, true_label, predicted_label, confidence,
+                                    uncertainty, inference_time, timestamp
+                             FROM trials WHERE session_id = ? {where}
+                             ORDER BY trial_id {order} LIMIT ?''',
+                             (session_id, *cursor, limit))
+            columns = [d[0] for d in c.description]
+            return [dict(zip(columns, row)) for row in c.fetchall()]
+    
+    def get_user_sessions(self, user_id, before=None, limit=50):
+        """Keyset-paginated sessions of a user, newest first"""
+        where, cursor = ('AND session_id < ?', (before,)) if before is not None else ('', ())
+        with self._connection() as conn:
+            c = conn.execute(f'''SELECT session_id, date, num_trials, avg_accuracy, notes
+                             FROM sessions WHERE user_id = ? {where}
+                             ORDER BY session_id DESC LIMIT ?''',
+                             (user_id, *cursor, limit))
+            columns = [d[0] for d in c.description]
+            return [dict(zip(columns, row)) for row in c.fetchall()]
+    
+    def get_session_stats(self, session_id):
+        """Aggregates over a session's trials, computed in SQL"""
+        self.flush()
+        with self._connection() as conn:
+            totals = conn.execute('''SELECT COUNT(*), AVG(confidence), AVG(uncertainty),
+                                           AVG(inference_time), MIN(timestamp), MAX(timestamp),
+                                           AVG(CASE WHEN true_label >= 0
+                                                    THEN predicted_label = true_label END)
+                                    FROM trials WHERE session_id = ?''', (session_id,)).fetchone()
+            
+            per_class = conn.execute('''SELECT predicted_label, COUNT(*), AVG(confidence)
+                                       FROM trials WHERE session_id = ?
+                                       GROUP BY predicted_label''', (session_id,)).fetchall()
+            
+            confusion = conn.execute('''SELECT true_label, predicted_label, COUNT(*)
+                                       FROM trials WHERE session_id = ? AND true_label >= 0
+                                       GROUP BY true_label, predicted_label''', (session_id,)).fetchall()
+        
+        return {
+            'session_id': session_id,
+            'num_trials': totals[0],
+            'mean_confidence': totals[1],
+            'mean_uncertainty': totals[2],
+            'mean_inference_time': totals[3],
+            'first_trial_at': totals[4],
+            'last_trial_at': totals[5],
+            'accuracy': totals[6],  # Over labelled trials only
+            'per_class': [{'predicted_label': label, 'count': count, 'mean_confidence': conf}
+                          for label, count, conf in per_class],
+            'confusion': [{'true_label': true, 'predicted_label': pred, 'count': count}
+                          for true, pred, count in confusion]
+        }
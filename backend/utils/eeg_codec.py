@@ -0,0 +1,125 @@
+"""
+Binary EEG payloads for /api/predict
+
+application/octet-stream (raw):
+    uint32 ndim | uint32 shape[ndim] | float32 data (C order)
+    all little-endian
+application/x-npy:
+    a .npy file; little-endian float32 C-order arrays are zero-copy
+
+Decoded arrays are views on the request buffer, so torch.from_numpy
+on them shares memory with the bytes read off the socket. Bodies larger
+than one window can need (MAX_PAYLOAD_BYTES) are rejected before any
+buffer is allocated.
+"""
+
+import io
+import struct
+import numpy as np
+from config import NUM_CHANNELS, WINDOW_SIZE
+
+RAW_CONTENT_TYPE = 'application/octet-stream'
+NPY_CONTENT_TYPE = 'application/x-npy'
+BINARY_CONTENT_TYPES = (RAW_CONTENT_TYPE, NPY_CONTENT_TYPE)
+
+MAX_NDIM = 3
+_FLOAT32_LE = np.dtype('<f4')
+
+# Largest valid payload: one (channels, samples) window, as float64 .npy
+# (header padded to at most a few KiB) or as raw float32 with MAX_NDIM dims
+_NPY_MAX_HEADER = 4096
+MAX_PAYLOAD_BYTES = max(_NPY_MAX_HEADER + NUM_CHANNELS * WINDOW_SIZE * 8,
+                        4 + 4 * MAX_NDIM + NUM_CHANNELS * WINDOW_SIZE * _FLOAT32_LE.itemsize)
+
+class PayloadTooLarge(ValueError):
+    """Content-Length above MAX_PAYLOAD_BYTES (HTTP 413)"""
+
+def read_body(stream, content_length):
+    """Read the request body into one writable, preallocated buffer"""
+    if content_length is None:
+        raise ValueError('Binary EEG payload requires a Content-Length header')
+    if content_length > MAX_PAYLOAD_BYTES:
+        raise PayloadTooLarge(f'EEG payload of {content_length} bytes exceeds {MAX_PAYLOAD_BYTES} bytes')
+    
+    buf = bytearray(content_length)
+    view = memoryview(buf)
+    pos = 0
+    while pos < content_length:
+        n = stream.readinto(view[pos:])
+        if not n:
+            break
+        pos += n
+    
+    if pos != content_length:
+        raise ValueError(f'Truncated EEG payload: got {pos} of {content_length} bytes')
+    return buf
+
+def encode_raw(eeg_data):
+    """Serialize an array as a raw float32 payload (for clients and tests)"""
+    eeg_data = np.ascontiguousarray(eeg_data, dtype=_FLOAT32_LE)
+    header = struct.pack(f'<I{eeg_data.ndim}I', eeg_data.ndim, *eeg_data.shape)
+    return header + eeg_data.tobytes()
+
+def decode_raw(buf):
+    """Raw payload -> float32 array viewing buf"""
+    if len(buf) < 4:
+        raise ValueError('EEG payload too short for shape header')
+    
+    (ndim,) = struct.unpack_from('<I', buf, 0)
+    if not 1 <= ndim <= MAX_NDIM:
+        raise ValueError(f'Invalid EEG payload ndim: {ndim}')
+    
+    offset = 4 + 4 * ndim
+    if len(buf) < offset:
+        raise ValueError('EEG payload too short for shape header')
+    shape = struct.unpack_from(f'<{ndim}I', buf, 4)
+    
+    count = int(np.prod(shape))
+    if len(buf) - offset != count * _FLOAT32_LE.itemsize:
+        raise ValueError(f'EEG payload size does not match shape {shape}')
+    
+    return np.frombuffer(buf, dtype=_FLOAT32_LE, count=count, offset=offset).reshape(shape)
+
+def decode_npy(buf):
+    """.npy payload -> array viewing buf (copied only if not float32)"""
+    if len(buf) < 10 or bytes(buf[:6]) != b'\x93NUMPY':
+        raise ValueError('Not a .npy payload')
+    
+    major = buf[6]
+    if major == 1:
+        (header_len,) = struct.unpack_from('<H', buf, 8)
+        offset = 10 + header_len
+    else:
+        (header_len,) = struct.unpack_from('<I', buf, 8)
+        offset = 12 + header_len
+    
+    # Only the (small) header is copied for parsing
+    header = io.BytesIO(bytes(buf[:offset]))
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    
+    if dtype.hasobject or len(shape) > MAX_NDIM:
+        raise ValueError('Unsupported .npy payload')
+    
+    count = int(np.prod(shape))
+    if len(buf) - offset != count * dtype.itemsize:
+        raise ValueError(f'.npy payload size does not match shape {shape}')
+    
+    data = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+    if fortran_order:
+        data = data.reshape(shape[::-1]).T
+    else:
+        data = data.reshape(shape)
+    
+    if dtype != _FLOAT32_LE:
+        data = data.astype(np.float32)
+    return data
+
+def decode_eeg_payload(buf, content_type):
+    """Dispatch on content type"""
+    if content_type == NPY_CONTENT_TYPE:
+        return decode_npy(buf)
+    return decode_raw(buf)
@@ -1,8 +1,41 @@
 import numpy as np
 import mne
+from functools import lru_cache
 from scipy import signal
 from config import EEG_CHANNELS, EEG_SAMPLING_RATE, WINDOW_SIZE
 
+@lru_cache(maxsize=64)
+def design_bandpass(lowcut, highcut, fs=250, order=4, output='sos'):
+    """Butterworth bandpass design, cached by (low, high, fs, order, output)"""
+    nyquist = fs / 2
+    # Shared between callers: treat the returned arrays as read-only
+    return signal.butter(order, [lowcut / nyquist, highcut / nyquist], btype='band', output=output)
+
+class StreamingBandpassFilter:
+    """
+    Causal Butterworth bandpass that keeps its state between chunks
+    Second-order sections with carried zi per channel: each call filters
+    only the new samples, so streaming cost is O(hop) instead of O(window).
+    """
+    
+    def __init__(self, lowcut, highcut, fs=250, order=4):
+        self.sos = design_bandpass(lowcut, highcut, fs, order)
+        self._zi_step = signal.sosfilt_zi(self.sos)  # (n_sections, 2), unit step response
+        self._zi = None
+    
+    def process(self, chunk):
+        """Filter a (channels, n) chunk, continuing from the previous one"""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self._zi is None:
+            # Start in steady state for the first sample to avoid an onset transient
+            self._zi = self._zi_step[:, np.newaxis, :] * chunk[np.newaxis, :, :1]
+        
+        filtered, self._zi = signal.sosfilt(self.sos, chunk, axis=-1, zi=self._zi)
+        return filtered.astype(np.float32, copy=False)
+    
+    def reset(self):
+        self._zi = None
+
 class EEGProcessor:
     def __init__(self):
         self.sampling_rate = EEG_SAMPLING_RATE
@@ -49,11 +82,7 @@ class EEGProcessor:
     @staticmethod
     def bandpass_filter(data, lowcut, highcut, fs=250, order=4):
         """Apply butterworth bandpass filter"""
-        nyquist = fs / 2
-        low = lowcut / nyquist
-        high = highcut / nyquist
-        
-        b, a = signal.butter(order, [low, high], btype='band')
+        b, a = design_bandpass(lowcut, highcut, fs, order, output='ba')
         filtered = signal.filtfilt(b, a, data, axis=-1)
         return filtered
     
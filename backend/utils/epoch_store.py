@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from config import (SAMPLING_RATE, WINDOW_SIZE, PHYSIONET_DATA_DIR, EPOCH_STORE_DIR, EPOCH_RUNS,
+                    EPOCH_EVENT_MAP, EPOCH_FILTER_BAND, EPOCH_TMIN, EPOCH_CHANNELS,
+                    INGEST_WORKERS, INGEST_FILTER_JOBS)
+from utils.eeg_processor import EEGProcessor
+
+ARRAYS = ('X', 'y', 'run', 'onset')
+
+class EpochStore:
+    """
+    Preprocessed epochs on disk, one directory of .npy arrays per subject
+    
+    <root>/<key>/params.json
+    <root>/<key>/S001/X.npy      (n_epochs, channels, samples) float32
+                     y.npy      (n_epochs,) int64 labels
+                     run.npy    (n_epochs,) run number
+                     onset.npy  (n_epochs,) cue onset in the resampled run (samples)
+                     (X in µV, or z-scored per epoch and channel when normalize)
+    
+    `key` hashes the preprocessing parameters (channels, rate, band, epoch
+    window, runs, event map, normalization), so changing any of them builds
+    a separate store instead of reusing stale epochs. Arrays are read back
+    memory-mapped.
+    """
+    
+    VERSION = 1  # Bump to invalidate stores after changing the pipeline
+    
+    def __init__(self, root=EPOCH_STORE_DIR, channels=EPOCH_CHANNELS, fs=SAMPLING_RATE,
+                 n_samples=WINDOW_SIZE, band=EPOCH_FILTER_BAND, tmin=EPOCH_TMIN, runs=EPOCH_RUNS,
+                 event_map=EPOCH_EVENT_MAP, normalize=True):
+        self.params = {
+            'version': self.VERSION,
+            'channels': list(channels),
+            'fs': fs,
+            'n_samples': n_samples,
+            'band': list(band),
+            'tmin': tmin,
+            'runs': list(runs),
+            'event_map': dict(event_map),
+            'normalize': normalize
+        }
+        spec = json.dumps(self.params, sort_keys=True)
+        self.key = hashlib.sha1(spec.encode()).hexdigest()[:16]
+        self.path = os.path.join(root, self.key)
+    
+    def subject_dir(self, subject):
+        return os.path.join(self.path, f'S{subject:03d}')
+    
+    def has(self, subject):
+        return os.path.exists(os.path.join(self.subject_dir(subject), 'X.npy'))
+    
+    def subjects(self):
+        """Subjects already built with these parameters"""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(name[1:]) for name in os.listdir(self.path)
+                      if name.startswith('S') and name[1:].isdigit() and self.has(int(name[1:])))
+    
+    def build_subject(self, subject, data_path=PHYSIONET_DATA_DIR, overwrite=False, n_jobs=1):
+        """
+        Read (downloading if needed), preprocess and store one subject's runs
+        n_jobs: MNE filtering jobs; returns the number of epochs
+        """
+        if self.has(subject) and not overwrite:
+            return len(self.load(subject)['y'])
+        
+        from mne.datasets import eegbci
+        raw_files = eegbci.load_data(subject, runs=self.params['runs'], path=data_path,
+                                     update_path=False, verbose='ERROR')
+        
+        arrays = {name: [] for name in ARRAYS}
+        for run, raw_file in zip(self.params['runs'], raw_files):
+            X, y, onset = self.preprocess_run(raw_file, n_jobs=n_jobs)
+            arrays['X'].append(X)
+            arrays['y'].append(y)
+            arrays['run'].append(np.full(len(y), run, dtype=np.int16))
+            arrays['onset'].append(onset)
+        
+        self.write_subject(subject, {name: np.concatenate(values) for name, values in arrays.items()})
+        return sum(len(y) for y in arrays['y'])
+    
+    def preprocess_run(self, raw_file, n_jobs=1):
+        """
+        One EDF run -> (epochs, labels, onsets)
+        Channel subset -> bandpass (FIR) -> resample -> cue-locked epochs of
+        n_samples -> per-epoch, per-channel z-score
+        """
+        import mne
+        from mne.datasets import eegbci
+        
+        params = self.params
+        raw = mne.io.read_raw_edf(raw_file, preload=True, verbose='ERROR')
+        eegbci.standardize(raw)  # 'C3..' -> 'C3'
+        raw.pick(params['channels'])
+        raw.filter(*params['band'], fir_design='firwin', n_jobs=n_jobs, verbose='ERROR')
+        if raw.info['sfreq'] != params['fs']:
+            raw.resample(params['fs'], verbose='ERROR')
+        
+        data = raw.get_data(units='uV').astype(np.float32)  # µV: keeps normalize()'s epsilon negligible
+        n_samples = params['n_samples']
+        epochs, labels, onsets = [], [], []
+        for annotation in raw.annotations:
+            label = params['event_map'].get(annotation['description'])
+            if label is None:
+                continue
+            start = int(round((annotation['onset'] + params['tmin']) * params['fs']))
+            if start < 0 or start + n_samples > data.shape[1]:
+                continue
+            epochs.append(data[:, start:start + n_samples])
+            labels.append(label)
+            onsets.append(start)
+        
+        X = np.stack(epochs) if epochs else np.empty((0, len(params['channels']), n_samples), np.float32)
+        if params['normalize']:
+            X = EEGProcessor.normalize(X).astype(np.float32)
+        return X, np.asarray(labels, dtype=np.int64), np.asarray(onsets, dtype=np.int64)
+    
+    def write_subject(self, subject, arrays):
+        """Write all arrays of a subject, then publish the directory atomically"""
+        os.makedirs(self.path, exist_ok=True)
+        params_path = os.path.join(self.path, 'params.json')
+        if not os.path.exists(params_path):
+            tmp_params = f'{params_path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_params, 'w') as f:
+                json.dump(self.params, f, indent=2)
+            os.replace(tmp_params, params_path)
+        
+        final_dir = self.subject_dir(subject)
+        tmp_dir = f'{final_dir}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(tmp_dir)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+        
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.replace(tmp_dir, final_dir)
+    
+    def load(self, subject, mmap_mode='r'):
+        """Memory-mapped arrays of one subject"""
+        subject_dir = self.subject_dir(subject)
+        return {name: np.load(os.path.join(subject_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+                for name in ARRAYS}
+    
+    def subject_bytes(self, subject):
+        subject_dir = self.subject_dir(subject)
+        return sum(os.path.getsize(os.path.join(subject_dir, f'{name}.npy')) for name in ARRAYS)
+    
+    def stats(self):
+        subjects = self.subjects()
+        n_bytes = sum(self.subject_bytes(subject) for subject in subjects)
+        n_epochs = sum(len(self.load(subject)['y']) for subject in subjects)
+        return {'key': self.key, 'path': self.path, 'subjects': subjects,
+                'epochs': n_epochs, 'bytes': n_bytes}
+
+def parse_subjects(specs):
+    """Subject specs such as ["1", "3-5"] -> sorted subject numbers [1, 3, 4, 5]"""
+    subjects = []
+    for spec in specs:
+        first, _, last = spec.partition('-')
+        subjects.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(subjects))
+
+def _ingest_job(store, subject, data_path, n_jobs):
+    """Worker: build one subject -> (subject, epochs, bytes written, seconds)"""
+    start = time.perf_counter()
+    n_epochs = store.build_subject(subject, data_path=data_path, n_jobs=n_jobs)
+    return subject, n_epochs, store.subject_bytes(subject), time.perf_counter() - start
+
+def ingest_subjects(store, subjects, n_workers=INGEST_WORKERS, n_jobs=INGEST_FILTER_JOBS,
+                    data_path=PHYSIONET_DATA_DIR, verbose=True):
+    """
+    Build many subjects concurrently into the store, one subject per worker
+    process (download, filter with MNE n_jobs, epoch, write). Subjects that
+    are already built are skipped. Progress and throughput are printed as
+    subjects complete; a failed subject is reported and does not stop the rest.
+    """
+    pending = [subject for subject in subjects if not store.has(subject)]
+    skipped = len(subjects) - len(pending)
+    n_workers = max(1, min(n_workers or os.cpu_count(), len(pending) or 1))
+    if verbose:
+        print(f"[INGEST] {len(pending)} subjects to build ({skipped} already built), "
+              f"{n_workers} workers x {n_jobs} filter jobs")
+    
+    summary = {'built': [], 'failed': {}, 'skipped': skipped, 'epochs': 0, 'bytes': 0}
+    start = time.perf_counter()
+    
+    def record(subject, result=None, error=None):
+        if error is not None:
+            summary['failed'][subject] = str(error)
+        else:
+            _, n_epochs, n_bytes, seconds = result
+            summary['built'].append(subject)
+            summary['epochs'] += n_epochs
+            summary['bytes'] += n_bytes
+        
+        if verbose:
+            done = len(summary['built']) + len(summary['failed'])
+            elapsed = time.perf_counter() - start
+            eta = elapsed / done * (len(pending) - done)
+            status = f"error: {error}" if error is not None else f"{result[1]} epochs in {result[3]:.1f}s"
+            print(f"[INGEST] {done}/{len(pending)} S{subject:03d} {status} | "
+                  f"{done / elapsed * 60:.1f} subjects/min, {summary['epochs'] / elapsed:.0f} epochs/s, "
+                  f"{summary['bytes'] / 1024 ** 2 / elapsed:.1f} MB/s, ETA {eta:.0f}s")
+    
+    if n_workers == 1:
+        for subject in pending:
+            try:
+                record(subject, _ingest_job(store, subject, data_path, n_jobs))
+            except Exception as e:
+                record(subject, error=e)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(_ingest_job, store, subject, data_path, n_jobs): subject
+                       for subject in pending}
+            for future in as_completed(futures):
+                try:
+                    record(futures[future], future.result())
+                except Exception as e:
+                    record(futures[future], error=e)
+    
+    summary['seconds'] = time.perf_counter() - start
+    summary['epochs_per_s'] = summary['epochs'] / summary['seconds'] if summary['seconds'] else 0.0
+    summary['built'].sort()
+    return summary
+
+class EpochDataset(Dataset):
+    """
+    Training epochs of several subjects, straight from an EpochStore
+    
+    Arrays are mapped copy-on-write (mmap_mode='c'): samples are
+    torch.from_numpy views on the page cache, with no read or copy per item,
+    and in-place augmentation never writes back to the store.
+    """
+    
+    def __init__(self, store, subjects, indices=None, mmap_mode='c'):
+        self.store = store
+        self.subjects = list(subjects)
+        self._arrays = [store.load(subject, mmap_mode=mmap_mode) for subject in self.subjects]
+        self._offsets = np.cumsum([0] + [len(arrays['y']) for arrays in self._arrays])
+        
+        # Optional subset (e.g. a train/test split) as global indices
+        self.indices = np.arange(self._offsets[-1]) if indices is None else np.asarray(indices)
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def _locate(self, index):
+        global_index = self.indices[index]
+        part = np.searchsorted(self._offsets, global_index, side='right') - 1
+        return self._arrays[part], global_index - self._offsets[part]
+    
+    def __getitem__(self, index):
+        arrays, row = self._locate(index)
+        return torch.from_numpy(arrays['X'][row]), int(arrays['y'][row])
+    
+    @property
+    def labels(self):
+        """All labels of the dataset, in index order"""
+        y = np.concatenate([arrays['y'] for arrays in self._arrays])
+        return y[self.indices]
+    
+    def subject_of(self, index):
+        part = np.searchsorted(self._offsets, self.indices[index], side='right') - 1
+        return self.subjects[part]
@@ -0,0 +1,108 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from collections import deque
+import numpy as np
+
+class LatencyWindow:
+    """
+    Thread-safe sliding window of recent latency samples (ms)
+    Percentiles are computed over the last `maxlen` samples
+    """
+    
+    def __init__(self, maxlen=2048):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.count = 0
+    
+    def record(self, latency_ms):
+        with self._lock:
+            self._samples.append(latency_ms)
+            self.count += 1
+    
+    def percentiles(self, qs=(50, 99)):
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=np.float64, count=len(self._samples))
+        if samples.size == 0:
+            return {f'p{q}': 0.0 for q in qs}
+        values = np.percentile(samples, qs)
+        return {f'p{q}': float(v) for q, v in zip(qs, values)}
+    
+    def snapshot(self):
+        return {'count': self.count, **self.percentiles()}
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (ms): constant memory, O(log buckets) updates
+    Percentiles are reported as the upper bound of the matching bucket
+    """
+    
+    DEFAULT_BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    
+    def __init__(self, bounds_ms=DEFAULT_BOUNDS_MS):
+        self.bounds = tuple(float(b) for b in bounds_ms)
+        self.counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)  # Last bucket: overflow
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ms):
+        bucket = bisect.bisect_left(self.bounds, latency_ms)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total_ms += latency_ms
+            self.max_ms = max(self.max_ms, latency_ms)
+    
+    def _percentile(self, counts, count, max_ms, q):
+        if count == 0:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(counts), q / 100.0 * count))
+        return self.bounds[bucket] if bucket < len(self.bounds) else max_ms
+    
+    def snapshot(self):
+        with self._lock:
+            counts = self.counts.copy()
+            count, total_ms, max_ms = self.count, self.total_ms, self.max_ms
+        
+        return {
+            'count': count,
+            'mean': total_ms / count if count else 0.0,
+            'max': max_ms,
+            'p50': self._percentile(counts, count, max_ms, 50),
+            'p99': self._percentile(counts, count, max_ms, 99),
+            'buckets': [{'le': le, 'count': int(c)}
+                        for le, c in zip(self.bounds + ('inf',), counts)]
+        }
+
+class StageMetrics:
+    """Per-stage latency histograms for the inference hot path"""
+    
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+    
+    def record(self, stage, elapsed_ns):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, LatencyHistogram())
+        histogram.record(elapsed_ns / 1e6)
+    
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter_ns() - start)
+    
+    def snapshot(self):
+        with self._lock:
+            stages = dict(self._stages)
+        return {stage: histogram.snapshot() for stage, histogram in sorted(stages.items())}
+
+# Process-wide registry: decode, to_tensor, forward, mc_sampling, xai, db_write, ...
+stage_metrics = StageMetrics()
@@ -0,0 +1,91 @@
+import numpy as np
+from config import NUM_CHANNELS, WINDOW_SIZE, STREAM_HOP, STREAM_BUFFER_SIZE
+
+class EEGRingBuffer:
+    """
+    Preallocated per-session circular buffer of shape (channels, capacity)
+    
+    Every sample is written twice, at i and i + capacity, into a
+    (channels, 2 * capacity) array, so the latest `window_size` samples are
+    always one contiguous slice. Windows are views, never concatenations.
+    A view stays valid until `capacity - window_size` more samples arrive.
+    
+    preprocess: optional callable applied to each incoming chunk before it
+    is stored (e.g. StreamingBandpassFilter.process)
+    """
+    
+    def __init__(self, n_channels=NUM_CHANNELS, window_size=WINDOW_SIZE,
+                 hop=STREAM_HOP, capacity=STREAM_BUFFER_SIZE, preprocess=None):
+        if hop < 1:
+            raise ValueError('hop must be at least one sample')
+        if capacity < window_size + hop:
+            raise ValueError('capacity must be at least window_size + hop')
+        
+        self.n_channels = n_channels
+        self.window_size = window_size
+        self.hop = hop
+        self.capacity = capacity
+        self.preprocess = preprocess
+        
+        self._data = np.zeros((n_channels, 2 * capacity), dtype=np.float32)
+        self._head = 0            # Next write position in [0, capacity)
+        self._since_hop = 0       # Samples written since the last hop boundary
+        self.total_samples = 0
+        self.windows = 0          # Windows emitted so far
+    
+    def push(self, chunk):
+        """
+        Append a (channels, n) chunk of samples
+        Yields the latest window (a view) at every hop boundary crossed
+        once at least window_size samples have been seen
+        """
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if chunk.ndim != 2 or chunk.shape[0] != self.n_channels:
+            raise ValueError(f'Expected a ({self.n_channels}, n) chunk, got shape {chunk.shape}')
+        if self.preprocess is not None:
+            chunk = self.preprocess(chunk)
+        
+        pos = 0
+        n_samples = chunk.shape[1]
+        while pos < n_samples:
+            step = min(n_samples - pos, self.hop - self._since_hop)
+            self._write(chunk[:, pos:pos + step])
+            pos += step
+            self._since_hop += step
+            
+            if self._since_hop == self.hop:
+                self._since_hop = 0
+                if self.total_samples >= self.window_size:
+                    self.windows += 1
+                    yield self.latest_window()
+    
+    def _write(self, block):
+        n = block.shape[1]
+        start = self._head
+        first = min(n, self.capacity - start)
+        
+        self._data[:, start:start + first] = block[:, :first]
+        self._data[:, start + self.capacity:start + self.capacity + first] = block[:, :first]
+        if first < n:
+            rest = n - first
+            self._data[:, :rest] = block[:, first:]
+            self._data[:, self.capacity:self.capacity + rest] = block[:, first:]
+        
+        self._head = (start + n) % self.capacity
+        self.total_samples += n
+    
+    def latest_window(self):
+        """(channels, window_size) view of the most recent samples"""
+        end = self._head + self.capacity
+        return self._data[:, end - self.window_size:end]
+    
+    def window_at(self, end):
+        """
+        View of the window ending at absolute sample index `end`
+        (total_samples at the time it was emitted), or None once overwritten
+        """
+        age = self.total_samples - end
+        if end < self.window_size or age < 0 or age > self.capacity - self.window_size:
+            return None
+        stop = (self._head - age) % self.capacity + self.capacity
+        return self._data[:, stop - self.window_size:stop]
@@ -0,0 +1,97 @@
+import threading
+from datetime import datetime
+import numpy as np
+from config import NUM_CLASSES, SESSION_HISTORY_SIZE
+from utils.constants import CLASS_LABELS
+from utils.metrics import LatencyHistogram
+
+class SessionState:
+    """
+    Compact in-memory state of one active BCI session
+    Recent predictions live in preallocated ring-buffer arrays and totals
+    are running accumulators, so memory is bounded and summaries are O(1)
+    however long the session runs. Safe to update from streaming threads.
+    """
+    
+    def __init__(self, user_id, capacity=SESSION_HISTORY_SIZE, n_classes=NUM_CLASSES):
+        self.user_id = user_id
+        self.start_time = datetime.now()
+        self.capacity = capacity
+        
+        # Ring buffer of recent predictions
+        self._trial_id = np.full(capacity, -1, dtype=np.int64)
+        self._trial_number = np.zeros(capacity, dtype=np.int64)
+        self._predicted = np.zeros(capacity, dtype=np.int8)
+        self._confidence = np.zeros(capacity, dtype=np.float32)
+        self._uncertainty = np.zeros(capacity, dtype=np.float32)
+        self._timestamp = np.zeros(capacity, dtype=np.float64)
+        self._head = 0
+        
+        # Running accumulators
+        self.count = 0
+        self._confidence_sum = 0.0
+        self.class_counts = np.zeros(n_classes, dtype=np.int64)
+        self.latency = LatencyHistogram()
+        
+        self._lock = threading.Lock()
+    
+    def record(self, prediction, trial_id=-1, trial_number=0, latency_ms=None):
+        """Add one prediction dict (IFNetPredictor format)"""
+        predicted = prediction['predicted_class']
+        confidence = prediction['confidence']
+        
+        with self._lock:
+            i = self._head
+            self._trial_id[i] = trial_id
+            self._trial_number[i] = trial_number
+            self._predicted[i] = predicted
+            self._confidence[i] = confidence
+            self._uncertainty[i] = prediction.get('uncertainty', 0.0)
+            self._timestamp[i] = datetime.now().timestamp()
+            self._head = (i + 1) % self.capacity
+            
+            self.count += 1
+            self._confidence_sum += confidence
+            self.class_counts[predicted] += 1
+        
+        if latency_ms is not None:
+            self.latency.record(latency_ms)
+    
+    @property
+    def mean_confidence(self):
+        with self._lock:
+            return self._confidence_sum / self.count if self.count else 0.0
+    
+    def recent(self, n=20):
+        """Latest n predictions, newest first"""
+        with self._lock:
+            n = min(n, self.count, self.capacity)
+            idx = (self._head - 1 - np.arange(n)) % self.capacity
+            rows = zip(self._trial_id[idx].tolist(), self._trial_number[idx].tolist(),
+                       self._predicted[idx].tolist(), self._confidence[idx].tolist(),
+                       self._uncertainty[idx].tolist(), self._timestamp[idx].tolist())
+        
+        return [{
+            'trial_id': trial_id,
+            'trial_number': trial_number,
+            'predicted_class': predicted,
+            'class_name': CLASS_LABELS[predicted],
+            'confidence': confidence,
+            'uncertainty': uncertainty,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+        } for trial_id, trial_number, predicted, confidence, uncertainty, timestamp in rows]
+    
+    def summary(self):
+        with self._lock:
+            count = self.count
+            mean_confidence = self._confidence_sum / count if count else 0.0
+            class_counts = self.class_counts.tolist()
+        
+        return {
+            'user_id': self.user_id,
+            'start_time': self.start_time.isoformat(),
+            'trials_count': count,
+            'mean_confidence': mean_confidence,
+            'class_counts': class_counts,
+            'latency_ms': self.latency.snapshot()
+        }
@@ -31,6 +31,13 @@ function App() {
       setPredictions(prev => [data, ...prev].slice(0, 50)); // Keep last 50
     });
 
+    // Explanations arrive asynchronously for sampled trials
+    newSocket.on('xai_update', (data) => {
+      setPredictions(prev => prev.map(p =>
+        p.trial_id === data.trial_id ? { ...p, xai: data.xai } : p
+      ));
+    });
+
     setSocket(newSocket);
 
     // Check backend health
@@ -1,7 +1,7 @@
 import React from 'react';
 
 function XAIDashboard({ predictions }) {
-  const latestPred = predictions;
+  const latestPred = predictions.find(p => p.xai); // Most recent explained trial
   const xai = latestPred?.xai?.grad_cam;
 
   return (